@@ -1,19 +1,56 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
+import backends
+from GOL_cycles import CycleDetector
+from topology import get_topology
+from instrument import INSTRUMENT
 
 class GOL(object):
-    def __init__(self, size, ini):
+    def __init__(self, size, ini, engine=None, neighbourhood="moore",
+                 boundary="periodic", workers=None):
         """
             Game of life class object
 
             Attributes:
             size = size (tuple), dimensions of Game of Life.
             initial_state = ini (str), initial state of lattice
-        """
+            engine = engine (str), backend used by evolve_state,
+                     "numba", "numpy" (whole lattice), "bitpacked"
+                     (64 cells per uint64 word), "sparse" (live
+                     cells only, for pattern starts), "strips"
+                     (one process per horizontal strip) or "python"
+                     (per cell reference). Defaults to $GOL_BACKEND,
+                     else the fastest one installed.
+            neighbourhood = neighbourhood (str), "moore",
+                            "von_neumann" or "hexagonal".
+            boundary = boundary (str), "periodic" or "open".
+                       Anything but a periodic Moore lattice
+                       runs on the "table" engine.
+            workers = workers (int), processes of the "strips"
+                      engine, defaults to $GOL_WORKERS, else the
+                      number of CPUs.
+        """
+        if (neighbourhood, boundary) == ("moore", "periodic"):
+            backend = backends.get_backend("gol", engine)
+            if workers is None:
+                self.backend = backend(size)
+            elif backend.name == "strips":
+                self.backend = backend(size, workers=workers)
+            else:
+                raise ValueError("Only the strips GOL engine takes workers.")
+        elif workers is not None:
+            raise ValueError("Only the strips GOL engine takes workers.")
+        elif engine in (None, "table"):
+            self.backend = backends.get_backend("gol", "table")(size, neighbourhood, boundary)
+        else:
+            raise ValueError("GOL engine " + str(engine) + " only runs periodic Moore "
+                             "lattices, use engine \"table\".")
         self.size = size
         self.ini = ini
+        self.neighbourhood = neighbourhood
+        self.boundary = boundary
+        self.engine = self.backend.name
         self.eqm = False
+        self.cycles = CycleDetector()
         self.build_lattice()
 
 
@@ -24,23 +61,43 @@ class GOL(object):
         """
         # Random config.
         if self.ini == "random":
-            self.lattice = np.random.choice(a=[0, 1], size=self.size)
+            self.state = self.backend.random_state()
+            return
+        lattice = np.zeros(self.size, dtype=np.int8)
         # Oscillator config.
         if self.ini == "oscillator":
-            self.lattice = np.zeros(self.size)
-            self.lattice[25:28, 25] = self.create_oscillator()
+            lattice[25:28, 25] = self.create_oscillator()
         # Glider config.
         if self.ini == "glider":
-            self.lattice = np.zeros(self.size)
-            self.lattice[0:3, 0:3] = self.create_glider()
+            lattice[0:3, 0:3] = self.create_glider()
         # Beehive config.
         if self.ini == "beehive":
-            self.lattice = np.zeros(self.size)
-            self.lattice[25:29, 24:27] = self.create_beehive()
+            lattice[25:29, 24:27] = self.create_beehive()
         # Square config.
         if self.ini == "square":
-            self.lattice = np.zeros(self.size)
-            self.lattice[25:27, 25] = self.create_square()
+            lattice[25:27, 25] = self.create_square()
+        self.lattice = lattice
+
+    @property
+    def topology(self):
+        """
+            Neighbour table of the lattice, built on first use
+            so engines that never read it do not pay for it.
+        """
+        return get_topology(self.size, self.neighbourhood, self.boundary)
+
+    @property
+    def lattice(self):
+        """
+            ndarray of lattice sites. The bitpacked and sparse
+            engines return an unpacked copy, so edits must be
+            written back by assigning to lattice.
+        """
+        return self.backend.to_lattice(self.state)
+
+    @lattice.setter
+    def lattice(self, lattice):
+        self.state = self.backend.from_lattice(lattice)
 
     def pbc(self, indices):
         """
@@ -92,71 +149,31 @@ class GOL(object):
     
     def count_nn(self, indices):
         """
-            Count the value of 8 nearest neighbours 
-            in the Game of Life.
+            Counts the live neighbours of a cell, looked
+            up in the topology table.
         """
-        i, j = indices
-        nearest_neighbours = 0
-
-        n_n = self.lattice[(i - 1) % self.size[1], j]
-        n_ne = self.lattice[(i - 1) %
-                            self.size[1], (j + 1) % self.size[0]]
-        n_e = self.lattice[i, (j + 1) % self.size[0]]
-        n_se = self.lattice[(i + 1) % self.size[1], (j + 1) % self.size[0]]
-        n_s = self.lattice[(i + 1) % self.size[1], j]
-        n_sw = self.lattice[(i + 1) % self.size[1], (j - 1) % self.size[0]]
-        n_w = self.lattice[i, (j - 1) % self.size[0]]
-        n_nw = self.lattice[(i - 1) % self.size[1], (j - 1) % self.size[0]]
-
-        if n_n == 1:
-            nearest_neighbours += 1
-        if n_ne == 1:
-            nearest_neighbours += 1
-        if n_e == 1:
-            nearest_neighbours += 1
-        if n_se == 1:
-            nearest_neighbours += 1
-        if n_s == 1:
-            nearest_neighbours += 1
-        if n_sw == 1:
-            nearest_neighbours += 1
-        if n_w == 1:
-            nearest_neighbours += 1
-        if n_nw == 1:
-            nearest_neighbours += 1
-        
-        return nearest_neighbours
+        site = indices[0] * self.size[1] + indices[1]
+        lattice = self.lattice.reshape(-1)
+        # Sites past an open edge are the cell itself.
+        return int(np.sum(lattice[self.topology.neighbours[site]]) -
+                   self.topology.missing[site] * lattice[site])
 
     def evolve_state(self):
         """
             Parallel updating scheme for the GOL.
         """
-        new_state = np.zeros(self.size)
-        for i in range(self.size[0]):
-            for j in range(self.size[1]):
-                indices = [i, j]
-                if self.lattice[i, j] == 1:
-                    if self.count_nn(indices) < 2:
-                        new_state[i, j] = 0
-                    elif self.count_nn(indices) > 3:
-                        new_state[i, j] = 0
-                    else:
-                        new_state[i, j] = 1
-
-                elif self.lattice[i, j] == 0:
-                    if self.count_nn(indices) == 3:
-                        new_state[i, j] = 1
-                    else:
-                        new_state[i, j] = 0
-
-        self.lattice = new_state
+        with INSTRUMENT.timer("evolve_state"):
+            self.state = self.backend.step(self.state)
+        INSTRUMENT.count("generations")
+        INSTRUMENT.count("cell_updates", self.size[0] * self.size[1])
 
     def count_live(self):
         """
             Returns the total number of live cells
             on the lattice.
         """
-        return np.sum(self.lattice)
+        with INSTRUMENT.timer("measurement"):
+            return self.backend.count_live(self.state)
 
     def check_eqm(self, live_cells):
         """
@@ -167,6 +184,27 @@ class GOL(object):
             if live_cells[-1] == live_cells[-2] and live_cells[-2] == live_cells[-3]:
                 self.eqm = True
 
+    def state_bytes(self):
+        """
+            Compact copy of the lattice state for hashing,
+            in the engine's own storage where possible.
+        """
+        return self.backend.state_bytes(self.state)
+
+    def check_cycle(self):
+        """
+            Checks if the GOL has entered a cycle (still life or
+            oscillator) by hashing the lattice. Call once before
+            the first generation and after every generation;
+            sets cycle_entry and cycle_period when found.
+        """
+        with INSTRUMENT.timer("measurement"):
+            found = self.cycles.update(self.state_bytes())
+        if found:
+            self.eqm = True
+            self.cycle_entry = self.cycles.entry
+            self.cycle_period = self.cycles.period
+
     def boundary_checker(self, x_indices, y_indices):
         """
             Checks if glider position is near the edge
@@ -203,8 +241,7 @@ class GOL(object):
             Returns a tuple of arrays of
             active glider cells.
         """
-        x_indices = np.where(self.lattice == 1)[0]
-        y_indices = np.where(self.lattice == 1)[1]
+        x_indices, y_indices = self.backend.live_cells(self.state)
         return (x_indices, y_indices)
 
     def get_com(self, x_indices, y_indices):
@@ -222,47 +259,32 @@ class GOL(object):
             Histogram plotter for
             steady state times.
         """
-        plt.title("Histogram of GOL EQM Times")
-        plt.xlabel("Time (Sweeps)")
-        plt.ylabel("Frequency")
-        plt.hist(data, num_bins, facecolor='green')
-        plt.savefig('gol_eqm_hist.png')
-        plt.show()
+        # Imported here so simulations never load matplotlib.
+        import GOL_plots
+        GOL_plots.plot_hist(data, num_bins)
 
     def plot_traj(self, x_data, y_data, all):
         """
             Scatter plotter for glider
             trajectory.
         """
-        if all == False:
-            plt.grid()
-            plt.title("GOL Glider trajectory")
-            plt.ylabel("x(t)")
-            plt.xlabel("Time (Sweeps)")
-            p = np.polyfit(x_data[:18], y_data[:18], 1)
-            y_fit = np.array(x_data[:18])*p[0] + p[1]
-            plt.plot(x_data[:18], y_fit, label ="x(t) = " + str(p[0]) +"t + " + str(p[1]))
-            plt.legend(loc = 'upper left')
-            plt.scatter(x_data[:18], y_data[:18])
-            plt.savefig('single_glider_vel.png')
-            plt.show()
-            return(p[0])
-        else:
-            plt.grid()
-            plt.title("GOL Glider trajectory")
-            plt.ylabel("x(t)")
-            plt.xlabel("Time (Sweeps)")
-            plt.scatter(x_data, y_data)
-            plt.savefig('all_glider_vel.png')
-            plt.show()
+        import GOL_plots
+        return GOL_plots.plot_traj(x_data, y_data, all)
+
+    def advance(self, it_per_sweep):
+        """
+            Advances the GOL by one animation frame of
+            it_per_sweep generations.
+        """
+        for i in range(it_per_sweep):
+            self.evolve_state()
 
     def animate(self, *args):
         """
             Creates, saves and returns image of the current state of
             lattice for the FuncAnimation class.
         """
-        for i in range(self.it_per_sweep):
-            self.evolve_state()
+        self.advance(self.it_per_sweep)
         self.image.set_array(self.lattice)
         return self.image,
 
@@ -271,9 +293,16 @@ class GOL(object):
             Used in partnership with the tester file
             to run the simulation.
         """
-        self.it_per_sweep = it_per_sweep
-        self.figure = plt.figure()
-        self.image = plt.imshow(self.lattice, cmap='jet', animated=True)
-        self.animation = animation.FuncAnimation(
-            self.figure, self.animate, repeat=False, frames=sweeps, interval=25, blit=True)
-        plt.show()
+        import GOL_plots
+        GOL_plots.run_animation(self, sweeps, it_per_sweep)
+
+    def export_video(self, path, sweeps, it_per_sweep, every=1, scale=1, fps=25):
+        """
+            Headless version of run_animation, streams frames to
+            a video file (via ffmpeg) or a directory of frames,
+            keeping one frame in every.
+        """
+        import renderer
+        return renderer.export(lambda: self.advance(it_per_sweep),
+                               lambda: self.lattice, renderer.GOL_COLOURS,
+                               path, sweeps, every=every, scale=scale, fps=fps)
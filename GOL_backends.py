@@ -0,0 +1,192 @@
+import numpy as np
+import GOL_kernels
+import GOL_packed
+import GOL_parallel
+import GOL_sparse
+from backends import register
+from topology import get_topology
+
+
+class DenseGOL(object):
+    available = True
+
+    def __init__(self, size):
+        """
+            GOL backend storing the lattice as a dense ndarray
+            and stepping it into a preallocated second buffer.
+
+            Attributes:
+            size = size (tuple), dimensions of the lattice.
+        """
+        self.size = size
+        self.buffer = None
+
+    def random_state(self):
+        """
+            State with every cell alive with probability 1/2.
+        """
+        return np.random.choice(a=np.array([0, 1], dtype=np.int8), size=self.size)
+
+    def from_lattice(self, lattice):
+        """
+            Backend state from a dense lattice, stored as int8.
+        """
+        return np.asarray(lattice, dtype=np.int8)
+
+    def to_lattice(self, state):
+        """
+            Dense lattice of a backend state.
+        """
+        return state
+
+    def kernel(self, lattice, out):
+        """
+            Writes the next generation of lattice into out.
+        """
+        raise NotImplementedError
+
+    def step(self, state):
+        """
+            One generation, swapping the state with the buffer.
+        """
+        if self.buffer is None or self.buffer.shape != state.shape or \
+                self.buffer.dtype != state.dtype:
+            self.buffer = np.empty_like(state)
+        self.kernel(state, self.buffer)
+        state, self.buffer = self.buffer, state
+        return state
+
+    def count_live(self, state):
+        """
+            Number of live cells.
+        """
+        return np.sum(state)
+
+    def live_cells(self, state):
+        """
+            Row and column indices of the live cells.
+        """
+        return np.where(state == 1)
+
+    def state_bytes(self, state):
+        """
+            Compact copy of the state for hashing.
+        """
+        return np.packbits(state == 1)
+
+
+@register("gol", "python")
+class PythonGOL(DenseGOL):
+    """
+        Reference per cell GOL backend.
+    """
+    def kernel(self, lattice, out):
+        GOL_kernels.python_step(lattice, out)
+
+
+@register("gol", "numpy")
+class NumpyGOL(DenseGOL):
+    """
+        Whole lattice GOL backend from rolled neighbour counts.
+    """
+    def kernel(self, lattice, out):
+        GOL_kernels.numpy_step(lattice, out)
+
+
+@register("gol", "numba")
+class NumbaGOL(DenseGOL):
+    """
+        Numba compiled GOL backend, threaded over rows.
+    """
+    available = GOL_kernels.compiled_numba_step is not None
+
+    def kernel(self, lattice, out):
+        GOL_kernels.compiled_numba_step(lattice, out)
+
+
+@register("gol", "table")
+class TableGOL(DenseGOL):
+    """
+        GOL backend reading neighbours from a topology table,
+        for open boundaries and non Moore neighbourhoods.
+    """
+    def __init__(self, size, neighbourhood="moore", boundary="periodic"):
+        DenseGOL.__init__(self, size)
+        self.topology = get_topology(size, neighbourhood, boundary)
+
+    def kernel(self, lattice, out):
+        if GOL_kernels.compiled_table_step is not None:
+            step = GOL_kernels.compiled_table_step
+        else:
+            step = GOL_kernels.numpy_table_step
+        step(lattice.reshape(-1), out.reshape(-1), self.topology.neighbours,
+             self.topology.missing)
+
+
+@register("gol", "bitpacked")
+class BitpackedGOL(object):
+    """
+        GOL backend storing 64 cells per uint64 word.
+    """
+    available = True
+
+    def __init__(self, size):
+        self.size = size
+
+    def random_state(self):
+        return GOL_packed.random_packed(self.size)
+
+    def from_lattice(self, lattice):
+        return GOL_packed.pack(np.asarray(lattice))
+
+    def to_lattice(self, state):
+        return GOL_packed.unpack(state, self.size)
+
+    def step(self, state):
+        return GOL_packed.step(state, self.size[1])
+
+    def count_live(self, state):
+        return GOL_packed.popcount(state)
+
+    def live_cells(self, state):
+        return np.where(self.to_lattice(state) == 1)
+
+    def state_bytes(self, state):
+        return state
+
+
+@register("gol", "sparse")
+class SparseGOL(object):
+    """
+        GOL backend storing only the flat indices of live
+        cells, for mostly empty pattern starts.
+    """
+    available = True
+
+    def __init__(self, size):
+        self.size = size
+
+    def random_state(self):
+        return GOL_sparse.to_live(np.random.choice(a=[0, 1], size=self.size))
+
+    def from_lattice(self, lattice):
+        return GOL_sparse.to_live(lattice)
+
+    def to_lattice(self, state):
+        return GOL_sparse.to_lattice(state, self.size)
+
+    def step(self, state):
+        return GOL_sparse.step(state, self.size)
+
+    def count_live(self, state):
+        return state.size
+
+    def live_cells(self, state):
+        return np.divmod(state, self.size[1])
+
+    def state_bytes(self, state):
+        return state
+
+
+# Multi-process strips, worth it for lattices of millions of cells.
+register("gol", "strips")(GOL_parallel.StripGOL)
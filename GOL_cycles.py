@@ -0,0 +1,55 @@
+from collections import deque
+import hashlib
+import numpy as np
+
+
+def lattice_hash(state):
+    """
+        64 bit hash of the raw bytes of a lattice state,
+        e.g. bit-packed cells or live cell indices.
+    """
+    state = np.ascontiguousarray(state)
+    digest = hashlib.blake2b(state.tobytes(), digest_size=8).digest()
+    return int.from_bytes(digest, "little")
+
+
+class CycleDetector(object):
+    def __init__(self, capacity=4096):
+        """
+            Detects when a sequence of lattice states enters a
+            cycle by keeping the hashes of recent generations.
+
+            Attributes:
+            capacity = capacity (int), number of generations
+                       remembered, cycles longer than this
+                       are not detected.
+            entry = generation at which the cycle was entered.
+            period = period of the cycle (1 for still lifes).
+        """
+        self.capacity = capacity
+        self.seen = {}
+        self.order = deque()
+        self.generation = 0
+        self.entry = None
+        self.period = None
+
+    def update(self, state):
+        """
+            Adds the next generation's state and returns True
+            once it repeats an earlier one. The first state
+            passed in is generation 0.
+        """
+        if self.period is not None:
+            return True
+        key = lattice_hash(state)
+        if key in self.seen:
+            # Earlier states did not repeat, so this is the entry.
+            self.entry = self.seen[key]
+            self.period = self.generation - self.entry
+            return True
+        self.seen[key] = self.generation
+        self.order.append(key)
+        if len(self.order) > self.capacity:
+            del self.seen[self.order.popleft()]
+        self.generation += 1
+        return False
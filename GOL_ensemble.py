@@ -0,0 +1,139 @@
+import numpy as np
+from GOL_cycles import CycleDetector
+from instrument import INSTRUMENT
+
+
+class GOLEnsemble(object):
+    def __init__(self, size, replicas, max_sweeps=4000, seed=None, rule="cycle"):
+        """
+            Batch of independent random Game of Life lattices
+            stepped together as one (K, H, W) array.
+
+            Attributes:
+            size = size (tuple), dimensions of each lattice.
+            replicas = replicas (int), number of lattices K.
+            max_sweeps = max_sweeps (int), sweeps after which a
+                         replica that never reached equilibrium
+                         is given up on.
+            seed = seed (int or SeedSequence), seed of the
+                   random number generator.
+            rule = rule (str), equilibrium test, "cycle" (the
+                   lattice repeats an earlier state) or "counts"
+                   (three equal live cell counts, as check_eqm).
+        """
+        self.size = size
+        self.replicas = replicas
+        self.max_sweeps = max_sweeps
+        self.rng = np.random.default_rng(seed)
+        self.lattices = self.rng.choice(a=np.array([0, 1], dtype=np.int8),
+                                        size=(replicas,) + tuple(size))
+        # Replica number of each lattice still in the batch.
+        self.ids = np.arange(replicas)
+        # Live cell counts of the last three sweeps.
+        self.live = np.zeros((replicas, 3), dtype=np.int64)
+        self.sweeps = 0
+        # Cells stepped so far, summed over the active replicas.
+        self.cell_updates = 0
+        self.rule = rule
+        self.eqm_times = [None] * replicas
+        self.periods = [None] * replicas
+        if rule == "cycle":
+            self.cycles = [CycleDetector() for i in range(replicas)]
+            self.check_cycles()
+
+    def evolve_state(self):
+        """
+            One B3/S23 generation of every active replica,
+            neighbour counts from periodic rolls along the
+            lattice axes.
+        """
+        lattices = self.lattices
+        with INSTRUMENT.timer("evolve_state"):
+            rows = lattices + np.roll(lattices, 1, axis=1) + np.roll(lattices, -1, axis=1)
+            nn = rows + np.roll(rows, 1, axis=2) + np.roll(rows, -1, axis=2) - lattices
+            self.lattices = ((nn == 3) | ((lattices == 1) & (nn == 2))).astype(np.int8)
+        self.cell_updates += lattices.size
+        INSTRUMENT.count("generations", lattices.shape[0])
+        INSTRUMENT.count("cell_updates", lattices.size)
+
+    def count_live(self):
+        """
+            Number of live cells of every active replica.
+        """
+        with INSTRUMENT.timer("measurement"):
+            return np.sum(self.lattices, axis=(1, 2), dtype=np.int64)
+
+    def check_eqm(self):
+        """
+            Replicas whose last three live cell counts match,
+            the same rule as GOL.check_eqm.
+        """
+        if self.sweeps <= 3:
+            return np.zeros(self.ids.size, dtype=bool)
+        return (self.live[:, 0] == self.live[:, 1]) & \
+            (self.live[:, 1] == self.live[:, 2])
+
+    def check_cycles(self):
+        """
+            Replicas whose lattice repeats an earlier state,
+            hashed per replica as packed bits.
+        """
+        with INSTRUMENT.timer("measurement"):
+            packed = np.packbits(self.lattices.reshape(self.ids.size, -1), axis=1)
+            done = np.zeros(self.ids.size, dtype=bool)
+            for k in range(self.ids.size):
+                done[k] = self.cycles[self.ids[k]].update(packed[k])
+        return done
+
+    def retire(self, done):
+        """
+            Records the equilibrium time of the replicas in
+            done and removes them from the batch.
+        """
+        for replica in self.ids[done]:
+            if self.rule == "cycle":
+                self.eqm_times[replica] = self.cycles[replica].entry
+                self.periods[replica] = self.cycles[replica].period
+                self.cycles[replica] = None
+            else:
+                # Minus 3 to account for check_eqm.
+                self.eqm_times[replica] = self.sweeps - 3
+        keep = ~done
+        self.lattices = self.lattices[keep]
+        self.live = self.live[keep]
+        self.ids = self.ids[keep]
+
+    def run(self):
+        """
+            Steps the batch until every replica has reached
+            equilibrium or max_sweeps have passed, and returns
+            the equilibrium time of each replica (None if it
+            never got there). With the cycle rule this is the
+            generation the cycle was entered, periods holds
+            the cycle periods.
+        """
+        while self.ids.size > 0 and self.sweeps < self.max_sweeps:
+            self.evolve_state()
+            self.sweeps += 1
+            if self.rule == "cycle":
+                done = self.check_cycles()
+            else:
+                # Only the counts rule reads the live cell counts.
+                self.live[:, :2] = self.live[:, 1:]
+                self.live[:, 2] = self.count_live()
+                done = self.check_eqm()
+            if np.any(done):
+                self.retire(done)
+        return self.eqm_times
+
+
+def ensemble_task(task, seed):
+    """
+        Runs one batch of replicas for sweeper.run_tasks.
+
+        task = dict with size, replicas, max_sweeps and
+               optionally rule.
+    """
+    ensemble = GOLEnsemble(task["size"], task["replicas"], task["max_sweeps"],
+                           seed=seed, rule=task.get("rule", "cycle"))
+    return ensemble.run()
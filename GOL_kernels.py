@@ -0,0 +1,154 @@
+import numpy as np
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+    prange = range
+
+
+def python_step(lattice, out):
+    """
+        Reference per cell B3/S23 generation of a dense
+        periodic lattice, written into out.
+    """
+    height, width = lattice.shape
+    for i in range(height):
+        for j in range(width):
+            nearest_neighbours = 0
+            for di in (-1, 0, 1):
+                for dj in (-1, 0, 1):
+                    if (di != 0 or dj != 0) and \
+                            lattice[(i + di) % height, (j + dj) % width] == 1:
+                        nearest_neighbours += 1
+            if lattice[i, j] == 1:
+                out[i, j] = 1 if 2 <= nearest_neighbours <= 3 else 0
+            else:
+                out[i, j] = 1 if nearest_neighbours == 3 else 0
+
+
+def count_nn_lattice(lattice):
+    """
+        Count the live nearest neighbours of every
+        site at once using periodic rolls of the lattice.
+    """
+    rows = lattice + np.roll(lattice, 1, axis=0) + np.roll(lattice, -1, axis=0)
+    return rows + np.roll(rows, 1, axis=1) + np.roll(rows, -1, axis=1) - lattice
+
+
+def numpy_step(lattice, out):
+    """
+        Whole lattice B3/S23 generation from rolled
+        neighbour counts, written into out.
+    """
+    nn = count_nn_lattice(lattice)
+    np.copyto(out, (nn == 3) | ((lattice == 1) & (nn == 2)))
+
+
+def numba_step(lattice, out):
+    """
+        B3/S23 generation compiled by Numba, rows are
+        split across threads with prange. Only the first
+        and last columns wrap around, so the inner loop
+        over the others vectorises.
+    """
+    height, width = lattice.shape
+    for i in prange(height):
+        up = lattice[(i - 1 + height) % height]
+        row = lattice[i]
+        down = lattice[(i + 1) % height]
+        for j in range(1, width - 1):
+            nn = up[j - 1] + up[j] + up[j + 1] + row[j - 1] + row[j + 1] \
+                + down[j - 1] + down[j] + down[j + 1]
+            out[i, j] = (nn == 3) | ((nn == 2) & (row[j] == 1))
+        for j in (0, width - 1):
+            left = (j - 1 + width) % width
+            right = (j + 1) % width
+            nn = up[left] + up[j] + up[right] + row[left] + row[right] \
+                + down[left] + down[j] + down[right]
+            out[i, j] = (nn == 3) | ((nn == 2) & (row[j] == 1))
+
+
+if njit is not None:
+    compiled_numba_step = njit(parallel=True, cache=True)(numba_step)
+else:
+    compiled_numba_step = None
+
+
+def numpy_strip_step(lattice, out, start, stop):
+    """
+        B3/S23 generation of rows start to stop of a dense
+        periodic lattice, reading one halo row either side
+        of the strip, written into the same rows of out.
+    """
+    rows = np.arange(start - 1, stop + 1) % lattice.shape[0]
+    strip = lattice[rows]
+    cols = strip[:-2] + strip[1:-1] + strip[2:]
+    nn = cols + np.roll(cols, 1, axis=1) + np.roll(cols, -1, axis=1) - strip[1:-1]
+    np.copyto(out[start:stop], (nn == 3) | ((strip[1:-1] == 1) & (nn == 2)))
+
+
+def numba_strip_step(lattice, out, start, stop):
+    """
+        Numba compiled generation of rows start to stop,
+        as numpy_strip_step. Each row first sums its column
+        triples so the inner loop has no wrap around.
+    """
+    height, width = lattice.shape
+    cols = np.empty(width + 2, dtype=np.int64)
+    for i in range(start, stop):
+        up = (i - 1 + height) % height
+        down = (i + 1) % height
+        for j in range(width):
+            cols[j + 1] = lattice[up, j] + lattice[i, j] + lattice[down, j]
+        cols[0] = cols[width]
+        cols[width + 1] = cols[1]
+        for j in range(width):
+            nn = cols[j] + cols[j + 1] + cols[j + 2] - lattice[i, j]
+            if nn == 3 or (nn == 2 and lattice[i, j] == 1):
+                out[i, j] = 1
+            else:
+                out[i, j] = 0
+
+
+if njit is not None:
+    compiled_numba_strip_step = njit(cache=True)(numba_strip_step)
+else:
+    compiled_numba_strip_step = None
+
+
+def table_step(lattice, out, neighbours, missing):
+    """
+        B3/S23 generation of a flattened lattice of any
+        topology, neighbours read from the topology table.
+        Entries past open edges point at the site itself,
+        so missing * state is taken off each count. Sites
+        are split across threads when compiled.
+    """
+    for site in prange(len(lattice)):
+        row = neighbours[site]
+        nn = 0
+        for m in range(len(row)):
+            nn += lattice[row[m]]
+        nn -= missing[site] * lattice[site]
+        if nn == 3 or (nn == 2 and lattice[site] == 1):
+            out[site] = 1
+        else:
+            out[site] = 0
+
+
+if njit is not None:
+    compiled_table_step = njit(parallel=True, cache=True)(table_step)
+else:
+    compiled_table_step = None
+
+
+def numpy_table_step(lattice, out, neighbours, missing):
+    """
+        Whole lattice table_step, one take per neighbour
+        column.
+    """
+    nn = -missing * lattice
+    for m in range(neighbours.shape[1]):
+        nn += np.take(lattice, neighbours[:, m])
+    np.copyto(out, (nn == 3) | ((lattice == 1) & (nn == 2)))
@@ -0,0 +1,131 @@
+import numpy as np
+
+# Cells per packed word.
+WORD = 64
+ONE = np.uint64(1)
+ALL = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def n_words(width):
+    """
+        Number of uint64 words needed to hold
+        one row of the lattice.
+    """
+    return -(-width // WORD)
+
+
+def tail_bits(width):
+    """
+        Number of valid cells in the last word
+        of each row (1 to 64).
+    """
+    return width - WORD * (n_words(width) - 1)
+
+
+def tail_mask(width):
+    """
+        Mask of the valid bits in the last word
+        of each row.
+    """
+    r = tail_bits(width)
+    if r == WORD:
+        return ALL
+    return np.uint64((1 << r) - 1)
+
+
+def pack(lattice):
+    """
+        Packs a 2D lattice of 0s and 1s into rows of
+        uint64 words, cell j of a row is bit j % 64
+        of word j // 64.
+    """
+    height, width = lattice.shape
+    padded = np.zeros((height, n_words(width) * WORD), dtype=np.uint8)
+    padded[:, :width] = lattice == 1
+    packed = np.packbits(padded, axis=1, bitorder='little')
+    return packed.view('<u8').astype(np.uint64)
+
+
+def unpack(packed, size, dtype=np.int8):
+    """
+        Unpacks rows of uint64 words back into a
+        2D lattice of 0s and 1s.
+    """
+    as_bytes = np.ascontiguousarray(packed, dtype='<u8').view(np.uint8)
+    bits = np.unpackbits(as_bytes, axis=1, bitorder='little')
+    return bits[:, :size[1]].astype(dtype)
+
+
+def random_packed(size):
+    """
+        Packed lattice where every cell is alive
+        with probability 1/2.
+    """
+    packed = np.random.randint(0, 2**64, size=(size[0], n_words(size[1])),
+                               dtype=np.uint64)
+    packed[:, -1] &= tail_mask(size[1])
+    return packed
+
+
+def shift_east(packed, width):
+    """
+        Row-wise shift so that each cell holds the
+        value of its east neighbour, wrapping the
+        last cell of a row onto the first.
+    """
+    r = np.uint64(tail_bits(width) - 1)
+    shifted = packed >> ONE
+    shifted[:, :-1] |= packed[:, 1:] << np.uint64(WORD - 1)
+    shifted[:, -1] |= (packed[:, 0] & ONE) << r
+    return shifted
+
+
+def shift_west(packed, width):
+    """
+        Row-wise shift so that each cell holds the
+        value of its west neighbour, wrapping the
+        first cell of a row onto the last.
+    """
+    r = np.uint64(tail_bits(width) - 1)
+    shifted = packed << ONE
+    shifted[:, 1:] |= packed[:, :-1] >> np.uint64(WORD - 1)
+    shifted[:, 0] |= (packed[:, -1] >> r) & ONE
+    shifted[:, -1] &= tail_mask(width)
+    return shifted
+
+
+def step(packed, width):
+    """
+        One B3/S23 generation on a packed periodic
+        lattice. The eight neighbour planes are summed
+        with bitwise adders into a saturating 3 bit
+        counter (s0, s1, s2), so a cell is alive next
+        generation when the count is 3, or 2 and alive.
+    """
+    north = np.roll(packed, 1, axis=0)
+    south = np.roll(packed, -1, axis=0)
+    planes = (north, south,
+              shift_east(packed, width), shift_west(packed, width),
+              shift_east(north, width), shift_west(north, width),
+              shift_east(south, width), shift_west(south, width))
+
+    s0 = np.zeros_like(packed)
+    s1 = np.zeros_like(packed)
+    s2 = np.zeros_like(packed)
+    for plane in planes:
+        c0 = s0 & plane
+        s0 ^= plane
+        c1 = s1 & c0
+        s1 ^= c0
+        s2 |= c1
+    return s1 & ~s2 & (s0 | packed)
+
+
+def popcount(packed):
+    """
+        Total number of set bits in a packed lattice.
+    """
+    if hasattr(np, "bitwise_count"):
+        return int(np.sum(np.bitwise_count(packed), dtype=np.int64))
+    table = np.array([bin(i).count("1") for i in range(256)], dtype=np.int64)
+    return int(np.sum(table[np.ascontiguousarray(packed).view(np.uint8)]))
@@ -0,0 +1,219 @@
+import os
+import threading
+import weakref
+import multiprocessing as mp
+from multiprocessing import connection, shared_memory
+import numpy as np
+import GOL_kernels
+
+# Forking after Numba has started its thread pool can deadlock,
+# so the strip workers are always spawned.
+context = mp.get_context("spawn")
+
+# Commands read by the strip workers at the start of a generation.
+STOP = 0
+STEP = 1
+COUNT = 2
+
+
+def strip_bounds(height, workers):
+    """
+        First and last row (exclusive) of each worker's
+        horizontal strip, as equal as possible.
+    """
+    edges = np.linspace(0, height, workers + 1).round().astype(int)
+    return [(edges[w], edges[w + 1]) for w in range(workers)]
+
+
+def views(blocks, size):
+    """
+        Views on the shared memory blocks: the two lattice
+        buffers, the control words (command, current buffer)
+        and the per strip live cell counts.
+    """
+    buffers = [np.ndarray(size, dtype=np.uint8, buffer=block.buf)
+               for block in blocks[:2]]
+    control = np.ndarray(2, dtype=np.int64, buffer=blocks[2].buf)
+    partials = np.ndarray(len(blocks[3].buf) // 8, dtype=np.int64,
+                          buffer=blocks[3].buf)
+    return buffers, control, partials
+
+
+def strip_worker(names, size, bounds, index, barrier):
+    """
+        Worker process of one strip. Waits at the barrier for
+        a command, steps (or counts) its strip of the current
+        buffer and waits again so every strip of a generation
+        is done before the buffers swap. Halo rows are read
+        straight from the neighbouring strips in shared memory.
+    """
+    blocks = [shared_memory.SharedMemory(name=name) for name in names]
+    buffers, control, partials = views(blocks, size)
+    start, stop = bounds
+    kernel = GOL_kernels.compiled_numba_strip_step
+    if kernel is None:
+        kernel = GOL_kernels.numpy_strip_step
+    try:
+        while True:
+            barrier.wait()
+            command, current = control
+            if command == STOP:
+                break
+            if command == STEP:
+                kernel(buffers[current], buffers[1 - current], start, stop)
+                current = 1 - current
+            partials[index] = np.count_nonzero(buffers[current][start:stop])
+            barrier.wait()
+    except threading.BrokenBarrierError:
+        # Another worker died, the main process reports it.
+        pass
+    except Exception:
+        barrier.abort()
+        raise
+    finally:
+        del buffers, control, partials
+        for block in blocks:
+            block.close()
+
+
+def watch(processes, barrier):
+    """
+        Breaks the barrier once any strip worker exits, so
+        the main process never waits for ever on a dead one.
+    """
+    connection.wait([process.sentinel for process in processes])
+    barrier.abort()
+
+
+def shutdown(processes, barrier, control, blocks):
+    """
+        Stops the strip workers and frees the shared memory.
+    """
+    if all(process.is_alive() for process in processes):
+        control[0] = STOP
+        try:
+            barrier.wait(timeout=10)
+        except Exception:
+            pass
+    for process in processes:
+        process.join(timeout=10)
+        if process.is_alive():
+            process.terminate()
+    for block in blocks:
+        try:
+            block.close()
+        except BufferError:
+            # Views are still held, the mapping goes with them.
+            pass
+        block.unlink()
+
+
+class StripGOL(object):
+    available = True
+
+    def __init__(self, size, workers=None):
+        """
+            GOL backend splitting the periodic lattice into
+            horizontal strips, one per worker process. The
+            lattice lives in shared memory double buffers and a
+            barrier synchronises each generation, so the grid
+            is never copied between processes.
+
+            Attributes:
+            size = size (tuple), dimensions of the lattice.
+            workers = workers (int), number of strip processes,
+                      defaults to $GOL_WORKERS, else the number
+                      of CPUs.
+        """
+        if workers is None:
+            workers = int(os.environ.get("GOL_WORKERS", os.cpu_count() or 1))
+        self.size = tuple(size)
+        self.workers = max(1, min(workers, self.size[0]))
+        nbytes = self.size[0] * self.size[1]
+        blocks = [shared_memory.SharedMemory(create=True, size=nbytes),
+                  shared_memory.SharedMemory(create=True, size=nbytes),
+                  shared_memory.SharedMemory(create=True, size=2 * 8),
+                  shared_memory.SharedMemory(create=True, size=self.workers * 8)]
+        names = [block.name for block in blocks]
+        self.buffers, self.control, self.partials = views(blocks, self.size)
+        self.control[:] = (COUNT, 0)
+        self.counted = False
+        # Workers plus this process.
+        self.barrier = context.Barrier(self.workers + 1)
+        self.processes = []
+        for index, bounds in enumerate(strip_bounds(self.size[0], self.workers)):
+            process = context.Process(target=strip_worker, daemon=True,
+                                 args=(names, self.size, bounds, index,
+                                       self.barrier))
+            process.start()
+            self.processes.append(process)
+        threading.Thread(target=watch, args=(self.processes, self.barrier),
+                         daemon=True).start()
+        self.finalizer = weakref.finalize(self, shutdown, self.processes,
+                                          self.barrier, self.control, blocks)
+
+    def run(self, command):
+        """
+            Runs one command on every strip and waits for all
+            of them to finish.
+        """
+        self.control[0] = command
+        try:
+            self.barrier.wait()
+            self.barrier.wait()
+        except Exception:
+            raise RuntimeError("A GOL strip worker failed.")
+
+    def close(self):
+        """
+            Stops the workers and frees the shared memory.
+        """
+        self.finalizer()
+
+    def random_state(self):
+        """
+            State with every cell alive with probability 1/2,
+            drawn a block of rows at a time.
+        """
+        state = self.buffers[self.control[1]]
+        for start in range(0, self.size[0], 1024):
+            stop = min(start + 1024, self.size[0])
+            state[start:stop] = np.random.randint(0, 2, size=(stop - start, self.size[1]),
+                                                  dtype=np.uint8)
+        self.counted = False
+        return state
+
+    def from_lattice(self, lattice):
+        state = self.buffers[self.control[1]]
+        state[...] = lattice
+        self.counted = False
+        return state
+
+    def to_lattice(self, state):
+        return state
+
+    def step(self, state):
+        """
+            One generation of every strip in parallel, the
+            strips also count their live cells.
+        """
+        self.run(STEP)
+        self.control[1] = 1 - self.control[1]
+        self.counted = True
+        return self.buffers[self.control[1]]
+
+    def count_live(self, state):
+        """
+            Number of live cells, the sum of the per strip
+            counts.
+        """
+        if not self.counted:
+            self.run(COUNT)
+            self.counted = True
+        return int(np.sum(self.partials))
+
+    def live_cells(self, state):
+        return np.where(state == 1)
+
+    def state_bytes(self, state):
+        return np.packbits(state)
@@ -0,0 +1,58 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.animation as animation
+
+
+def plot_hist(data, num_bins):
+    """
+        Histogram plotter for
+        steady state times.
+    """
+    plt.title("Histogram of GOL EQM Times")
+    plt.xlabel("Time (Sweeps)")
+    plt.ylabel("Frequency")
+    plt.hist(data, num_bins, facecolor='green')
+    plt.savefig('gol_eqm_hist.png')
+    plt.show()
+
+
+def plot_traj(x_data, y_data, all):
+    """
+        Scatter plotter for glider trajectory,
+        returns the fitted velocity of a single
+        glider when all is False.
+    """
+    if all == False:
+        plt.grid()
+        plt.title("GOL Glider trajectory")
+        plt.ylabel("x(t)")
+        plt.xlabel("Time (Sweeps)")
+        p = np.polyfit(x_data[:18], y_data[:18], 1)
+        y_fit = np.array(x_data[:18])*p[0] + p[1]
+        plt.plot(x_data[:18], y_fit, label ="x(t) = " + str(p[0]) +"t + " + str(p[1]))
+        plt.legend(loc = 'upper left')
+        plt.scatter(x_data[:18], y_data[:18])
+        plt.savefig('single_glider_vel.png')
+        plt.show()
+        return(p[0])
+    else:
+        plt.grid()
+        plt.title("GOL Glider trajectory")
+        plt.ylabel("x(t)")
+        plt.xlabel("Time (Sweeps)")
+        plt.scatter(x_data, y_data)
+        plt.savefig('all_glider_vel.png')
+        plt.show()
+
+
+def run_animation(game, sweeps, it_per_sweep):
+    """
+        Shows a live animation of a GOL,
+        it_per_sweep generations per frame.
+    """
+    game.it_per_sweep = it_per_sweep
+    game.figure = plt.figure()
+    game.image = plt.imshow(game.lattice, cmap='jet', animated=True)
+    game.animation = animation.FuncAnimation(
+        game.figure, game.animate, repeat=False, frames=sweeps, interval=25, blit=True)
+    plt.show()
@@ -1,14 +1,34 @@
 from GOL import GOL
+from GOL_ensemble import ensemble_task
+from checkpoint import Checkpoint
+from result_store import ResultStore
+from sweeper import run_tasks
+from instrument import INSTRUMENT
 import numpy as np
-import sys
+import argparse
 
 def main():
-    if len(sys.argv) != 2:
-        print("Wrong number of arguments.")
-        print("Usage: " + sys.argv[0] + " <parameters file>")
-        quit()
-    else:
-        infile_parameters = sys.argv[1]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip simulations already in the checkpoint")
+    parser.add_argument("--batch", type=int, default=100,
+                        help="random lattices stepped together per task")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for the batches (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="root seed of the per batch random streams")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (default: gol_<initial conditions>.ckpt)")
+    parser.add_argument("--instrument", default=None, metavar="PATH",
+                        help="write counters, phase timers and per batch "
+                             "rates as JSON to PATH")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="write cProfile stats of every batch to DIR")
+    args = parser.parse_args()
+    if args.instrument is not None or args.profile is not None:
+        INSTRUMENT.enable(args.profile)
+    infile_parameters = args.parameters
 
     # Open input file and assinging parameters.
     with open(infile_parameters, "r") as input_file:
@@ -20,47 +40,53 @@ def main():
         ini_cond = str(items[1])     # Initial conditions.
         lattice_size = (int(items[2]), int(items[2]))  # Lattice size.
 
-    game = GOL(size=lattice_size, ini=ini_cond)
+    # Pattern starts are mostly empty, so only track live cells.
+    if ini_cond == 'random':
+        engine = None
+    else:
+        engine = 'sparse'
+    game = GOL(size=lattice_size, ini=ini_cond, engine=engine)
 
     # Simulation for GOL steady state determination.
     if game.ini == 'random':
-        eqm_times = []
+        # Replicas are stepped together in batches, one task per batch.
+        tasks = []
+        for start in range(0, simulations, args.batch):
+            tasks.append({"size": lattice_size, "max_sweeps": 4000,
+                          "replicas": min(args.batch, simulations - start)})
+
+        # Finished batches are saved as they complete.
+        params = {"simulations": simulations, "ini": ini_cond,
+                  "lattice_size": lattice_size, "batch": args.batch,
+                  "seed": args.seed}
+        store = Checkpoint(args.checkpoint or "gol_" + ini_cond + ".ckpt",
+                           params, resume=args.resume)
+        # Batches finished by an earlier run.
+        skip = [k for k in range(len(tasks)) if store.done([k])]
+        # Equilibrium time of every replica, -1 if it hit the cap.
+        results = ResultStore("gol_eqm_hist", attrs=params, mode="w")
+        results.set_attrs(max_sweeps=4000)
+        results.create("replica_times", (simulations,), dtype=np.int64, fill=-1)
+
         # Simulation begins.
-        for i in range(simulations):
-            print(i)
-            live_cells = []
-            game = GOL(size=lattice_size, ini=ini_cond)
-            # Counter.
-            sweeps = 0 
-            # Whilst not in EQM.
-            while game.eqm == False:
-                # Evolve state.
-                game.evolve_state()
-                # Update sweeps.
-                sweeps += 1
-                # Count number of live cells in state.
-                live_cells.append(game.count_live())
-                # Steady state determination.
-                game.check_eqm(live_cells)
-                # Prevents infinite loop.
-                if sweeps == 4000:
-                    break
-            # Data storing.
-            if sweeps == 4000:
-                pass
-            else:
-                # Minus 3 to account for check_eqm.
-                eqm_times.append(len(live_cells) - 3)
-                print (eqm_times[i])
+        for k, times in run_tasks(ensemble_task, tasks, workers=args.workers,
+                                  seed=args.seed, skip=skip):
+            print(k, times)
+            store.save([k], times)
+
+        # Replicas that hit the sweep cap are left out.
+        eqm_times = []
+        for k in range(len(tasks)):
+            for r, time in enumerate(store.get([k])):
+                if time is not None:
+                    eqm_times.append(time)
+                    results.write("replica_times", k * args.batch + r, time)
 
         # Plotting.
         game.plot_hist(eqm_times, np.arange(0, 3000, 100))
 
-        # Writing to file.
-        with open("gol_eqm_hist.dat", "w+") as f:
-            f.write("GOL Sweeps to Reach Equilibrium\n")
-            for time in eqm_times:
-                f.write('%lf\n' % time)
+        # Writing to the result store.
+        results.save("eqm_times", np.array(eqm_times, dtype=np.int64))
 
     elif game.ini == 'glider':
         # Initialising data storage.
@@ -69,28 +95,38 @@ def main():
         times = []
         plot_all = True
         meas_skips = 10
-        # Simulation begins.
-        for i in range(simulations):
-            for j in range(meas_skips):
-                game.evolve_state()
-            # Find live cells of glider.
-            xs = game.get_glider_pos()[0]
-            ys = game.get_glider_pos()[1]
-            # Check if at lattice boundary.
-            x_checker, y_checker = game.boundary_checker(xs, ys)
-            # Store COM pos if not at lattice boundary.
-            if x_checker == False and y_checker == False:
-                times.append(i)
-                x_pos.append(game.get_com(xs, ys)[0] / meas_skips)
-                y_pos.append(game.get_com(xs, ys)[1] / meas_skips)
+        # Simulation begins, timed as a single point.
+        with INSTRUMENT.point(["glider"]):
+            for i in range(simulations):
+                for j in range(meas_skips):
+                    game.evolve_state()
+                # Find live cells of glider.
+                xs = game.get_glider_pos()[0]
+                ys = game.get_glider_pos()[1]
+                # Check if at lattice boundary.
+                x_checker, y_checker = game.boundary_checker(xs, ys)
+                # Store COM pos if not at lattice boundary.
+                if x_checker == False and y_checker == False:
+                    times.append(i)
+                    x_pos.append(game.get_com(xs, ys)[0] / meas_skips)
+                    y_pos.append(game.get_com(xs, ys)[1] / meas_skips)
 
         # Printing glider velocity.
         vel = game.plot_traj(times, x_pos, all=plot_all)
         if plot_all == False:
             print("The velocity of the glider is " + str(vel) + " cells / sweep")
         
-        # Writing to a file.
-        with open("gol_glider.dat", "w+") as f:
-            f.writelines(map("{}, {}, {}\n".format, times, x_pos, y_pos))
-        
-main()
+        # Writing to the result store.
+        results = ResultStore("gol_glider", mode="w",
+                              attrs={"simulations": simulations, "ini": ini_cond,
+                                     "lattice_size": lattice_size,
+                                     "meas_skips": meas_skips})
+        results.save("times", np.array(times, dtype=np.int64))
+        results.save("x", np.array(x_pos))
+        results.save("y", np.array(y_pos))
+
+    if args.instrument is not None:
+        INSTRUMENT.write(args.instrument)
+
+if __name__ == "__main__":
+    main()
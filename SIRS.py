@@ -1,23 +1,67 @@
 import numpy as np
-import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import math
+# Kernels (and numba) load with the first backend, not on import.
+import backends
+from topology import is_bipartite, neighbour_table
+from instrument import INSTRUMENT
+from SIRS_stats import RunningStats, bootstrap_variances, jackknife_variance_error, \
+    blocking_error, mser
 
 
 class SIRS(object):
-    def __init__(self, size, ini, p1, p2, p3):
+    schemes = ("sequential", "synchronous", "checkerboard", "kmc")
+    # Probability of attempting a site in a checkerboard half-step. At 1/2
+    # the infected variance near the transition is ~40% above random
+    # sequential, at 1/4 it agrees to a few percent.
+    CHECKERBOARD_ATTEMPT = 0.25
+
+    def __init__(self, size, ini, p1, p2, p3, seed=None, scheme="sequential",
+                 backend=None, neighbourhood="von_neumann", boundary="periodic"):
         """
             SIRS Model class object
 
             Attributes:
             size = size (tuple), dimensions of SIRS simulation.
             initial_state = ini (str), initial state of lattice
+            seed = seed (int or SeedSequence), seed of the
+                   random number generator.
+            scheme = scheme (str), update scheme of a sweep,
+                     "sequential" (N random site updates) or
+                     "synchronous" (whole lattice at once) or
+                     "checkerboard" (random sites of one colour of a
+                     red/black checkerboard at once, needs even dimensions)
+                     or "kmc" (rejection-free random sequential,
+                     only the updates that change a site are
+                     simulated).
+            backend = backend (str), kernel of the sequential,
+                      checkerboard and kmc schemes, "numba", "numpy" or "python".
+                      Defaults to $SIRS_BACKEND, else the fastest
+                      one installed for this lattice size.
+            neighbourhood = neighbourhood (str), sites that can
+                            infect a site, "von_neumann", "moore"
+                            or "hexagonal".
+            boundary = boundary (str), "periodic" or "open".
         """
+        if scheme not in self.schemes:
+            raise ValueError("Unknown SIRS update scheme: " + str(scheme))
+        if scheme == "checkerboard" and not is_bipartite(size, neighbourhood, boundary):
+            raise ValueError("The checkerboard scheme needs a von Neumann neighbourhood "
+                             "with even lattice dimensions or open boundaries.")
+        # Flat neighbour indices of every flat site, None wraps indices.
+        self.neighbours = neighbour_table(size, neighbourhood, boundary)
+        self.scheme = scheme
+        self.backend = backends.get_backend("sirs", backend, size)
         self.size = size
         self.ini = ini
         self.p1 = p1
         self.p2 = p2
         self.p3 = p3
+        self.rng = np.random.default_rng(seed)
+        self.history = None
+        self.stats = None
+        # Uniforms of the kmc scheme, drawn in blocks.
+        self.kmc_rands = np.zeros(0)
+        self.kmc_index = 0
         self.build_lattice()
 
     def build_lattice(self):
@@ -27,7 +71,54 @@ class SIRS(object):
         """
         # Random config.
         if self.ini == "random":
-            self.lattice = np.random.choice(a=[-1, 0, 1], size=self.size)
+            self.lattice = self.rng.choice(a=[-1, 0, 1], size=self.size)
+
+    @property
+    def lattice(self):
+        """
+            int8 ndarray of lattice sites, S = -1, I = 0, R = 1
+            and immune = 2. Assigning a new lattice recounts the
+            states, in place edits must call recount.
+        """
+        return self._lattice
+
+    @lattice.setter
+    def lattice(self, lattice):
+        self._lattice = np.asarray(lattice, dtype=np.int8)
+        self.recount()
+
+    def recount(self):
+        """
+            Recounts the number of S, I, R and immune sites,
+            stored in counts at index state + 1.
+        """
+        self.counts = np.bincount(self._lattice.reshape(-1) + 1,
+                                  minlength=4)[:4].astype(np.int64)
+        # Immune sites never change, so only the others are visited.
+        if self.counts[3] > 0:
+            self.mobile = np.flatnonzero(self._lattice.reshape(-1) != 2)
+        else:
+            self.mobile = None
+        # Sites that can change, rebuilt by the kmc scheme when needed.
+        self.kmc_classes = None
+
+    def seed_immune(self, frac):
+        """
+            Makes exactly round(frac * N) distinct random
+            sites immune (state 2).
+        """
+        n_sites = self.size[0] * self.size[1]
+        immune = self.rng.choice(n_sites, int(round(frac * n_sites)), replace=False)
+        np.put(self.lattice, immune, 2)
+        self.recount()
+
+    def n_mobile(self):
+        """
+            Number of sites that can change state.
+        """
+        if self.mobile is None:
+            return self.size[0] * self.size[1]
+        return self.mobile.size
 
     def pbc(self, indices):
         """
@@ -40,21 +131,17 @@ class SIRS(object):
         """
             Random number generator.
         """
-        return (np.random.uniform(0, 1))
+        return (self.rng.uniform(0, 1))
 
     def check_infected(self, indices):
         """
             Checks for infected neareast neighbours
             in SIRS model.
         """
-        i, j = indices
-        n_n = self.lattice[(i - 1) % self.size[0], j]
-        n_e = self.lattice[i, (j + 1) % self.size[1]]
-        n_s = self.lattice[(i + 1) % self.size[0], j]
-        n_w = self.lattice[i, (j - 1) % self.size[1]]
-        neighbours = [n_n, n_e, n_s, n_w]
-
-        if 0 in neighbours:
+        import SIRS_kernels
+        site = indices[0] * self.size[1] + indices[1]
+        if SIRS_kernels.infected_neighbour(self.lattice.reshape(-1), self.neighbours,
+                                           self.size[0], self.size[1], site):
             r = self.get_random()
             if r <= self.p1:
                 return True
@@ -67,48 +154,238 @@ class SIRS(object):
         """
             SIRS update algorithm.
         """
-        indices = (np.random.randint(0, self.size[0]),
-                   np.random.randint(0, self.size[1]))
+        indices = (self.rng.integers(0, self.size[0]),
+                   self.rng.integers(0, self.size[1]))
 
         if self.lattice[indices] == -1:
             outcome = self.check_infected(indices)
             if outcome == True:
                 self.lattice[indices] = 0
+                self.counts[0] -= 1
+                self.counts[1] += 1
 
         elif self.lattice[indices] == 0:
             r_2 = self.get_random()
             if r_2 <= self.p2:
                 self.lattice[indices] = 1
+                self.counts[1] -= 1
+                self.counts[2] += 1
 
         elif self.lattice[indices] == 1:
             r_3 = self.get_random()
             if r_3 <= self.p3:
                 self.lattice[indices] = -1
+                self.counts[2] -= 1
+                self.counts[0] += 1
+
+    def update(self, n_updates):
+        """
+            Batched SIRS update algorithm, equivalent to
+            n_updates calls of update_SIRS with all sites
+            and random numbers drawn up front. Immune sites
+            are left out of the draw. Returns the number of
+            sites that changed state.
+        """
+        if self.mobile is None:
+            sites = self.rng.integers(0, self.size[0] * self.size[1],
+                                      size=n_updates)
+        else:
+            sites = self.mobile[self.rng.integers(0, self.mobile.size,
+                                                  size=n_updates)]
+        rands = self.rng.random(n_updates)
+        return self.backend.sequential(self.lattice, self.counts, self.neighbours,
+                                       sites, rands, self.p1, self.p2, self.p3)
+
+    def step_synchronous(self):
+        """
+            Synchronous SIRS update of every site at once,
+            with a single uniform drawn per site.
+        """
+        import SIRS_kernels
+        rands = self.rng.random(self.size)
+        return SIRS_kernels.synchronous_step(self.lattice, self.counts, self.neighbours,
+                                             rands, self.p1, self.p2, self.p3)
+
+    def step_checkerboard(self):
+        """
+            Checkerboard SIRS sweep of 2 / CHECKERBOARD_ATTEMPT
+            half-steps. Each half-step picks a colour at random
+            and attempts each of its sites with probability
+            CHECKERBOARD_ATTEMPT, so every site is attempted
+            once per sweep on average and its number of
+            attempts is random, as in a random sequential
+            sweep. The neighbours of a site are all of the
+            other colour, so a half-step gives the same result
+            as visiting its attempted sites one by one.
+        """
+        changes = 0
+        for half in range(int(round(2 / self.CHECKERBOARD_ATTEMPT))):
+            colour = int(self.rng.integers(2))
+            rands = self.rng.random(self.size)
+            changes += self.backend.checkerboard(self.lattice, self.counts, self.neighbours,
+                                                 rands, colour, self.CHECKERBOARD_ATTEMPT,
+                                                 self.p1, self.p2, self.p3)
+        return changes
+
+    def step_kmc(self):
+        """
+            Rejection-free sweep, the same dynamics as a
+            random sequential sweep of N updates but only the
+            updates that change a site are simulated: S sites
+            with an infected neighbour, I and R sites are kept
+            in lists and the attempts in between are skipped.
+        """
+        import SIRS_kernels
+        if self.kmc_classes is None:
+            self.kmc_classes = SIRS_kernels.kmc_classes(self.lattice, self.neighbours)
+        self.kmc_rands, self.kmc_index, attempts, changes = self.backend.kmc(
+            self.lattice, self.counts, self.neighbours, self.kmc_classes,
+            self.n_mobile(), self.p1, self.p2, self.p3, self.kmc_rands,
+            self.kmc_index, self.n_mobile(), refill=self.kmc_block)
+        return changes
+
+    def kmc_block(self):
+        """
+            Next block of uniforms of the kmc scheme, three
+            per event.
+        """
+        return self.rng.random(3 * 2**16)
+
+    def sweep(self, n_sweeps=1):
+        """
+            Performs n_sweeps sweeps of the lattice, each
+            sweep being one random sequential update per
+            non-immune site (simulated directly or rejection
+            free), one synchronous step or one checkerboard
+            sweep. The state counts after each
+            sweep are stored if a time series has been
+            started with record.
+        """
+        for sweep in range(n_sweeps):
+            with INSTRUMENT.timer("sweep"):
+                if self.scheme == "synchronous":
+                    changes = self.step_synchronous()
+                elif self.scheme == "checkerboard":
+                    changes = self.step_checkerboard()
+                elif self.scheme == "kmc":
+                    changes = self.step_kmc()
+                else:
+                    changes = self.update(self.n_mobile())
+            self.after_sweep(changes)
+
+    def after_sweep(self, changes):
+        """
+            Stores the state counts of the sweep just done
+            and counts it in the instrument, the recording
+            timed as measurement.
+        """
+        if INSTRUMENT.enabled:
+            INSTRUMENT.count("sweeps")
+            INSTRUMENT.count("site_updates", self.n_mobile())
+            INSTRUMENT.count("transitions", int(changes))
+        if self.history is None and self.stats is None:
+            return
+        with INSTRUMENT.timer("measurement"):
+            if self.history is not None and \
+                    self.n_recorded < self.history.shape[0]:
+                self.history[self.n_recorded] = self.counts
+                self.n_recorded += 1
+            if self.stats is not None:
+                self.stats.update(self.counts[1])
+
+    def record(self, n_sweeps):
+        """
+            Starts a per sweep time series of the S, I, R
+            and immune counts, preallocated for n_sweeps.
+        """
+        self.history = np.zeros((n_sweeps, 4), dtype=np.int64)
+        self.n_recorded = 0
+
+    def get_history(self):
+        """
+            Recorded counts so far, one row per sweep with
+            columns S, I, R and immune.
+        """
+        return self.history[:self.n_recorded]
+
+    def start_stats(self):
+        """
+            Starts streaming mean and variance accumulators of
+            the infected count, updated after every sweep.
+        """
+        self.stats = RunningStats()
+        return self.stats
+
+    def equilibration(self):
+        """
+            Number of recorded sweeps before the infected
+            count reached equilibrium, by MSER-5.
+        """
+        return mser(self.get_history()[:, 1])
+
+    def check_converged(self, mean_error=None, var_error=None, min_sweeps=100):
+        """
+            Checks if a recorded run can stop, returning
+            (done, equilibration sweeps). It is done once the
+            infection has died out, or once at least min_sweeps
+            were measured after equilibration and the standard
+            errors of <I>/N (blocking) and Var(I)/N (blocked
+            jackknife) are below the targets given.
+        """
+        eqm = self.equilibration()
+        if self.get_infected() == 0:
+            return True, eqm
+        psis = self.get_history()[eqm:, 1]
+        if psis.size < min_sweeps:
+            return False, eqm
+        if mean_error is not None and \
+                blocking_error(psis) / (self.size[0] * self.size[1]) > mean_error:
+            return False, eqm
+        if var_error is not None and self.jackknife(psis) > var_error:
+            return False, eqm
+        return True, eqm
+
+    def sweep_until_converged(self, max_sweeps, mean_error=None, var_error=None,
+                              min_sweeps=100, check_every=100):
+        """
+            Records and sweeps the lattice, checking every
+            check_every sweeps, until check_converged or
+            max_sweeps. Returns the equilibration sweeps, the
+            measurement is get_history()[eqm:].
+        """
+        self.record(max_sweeps)
+        eqm = 0
+        while self.n_recorded < max_sweeps:
+            self.sweep(min(check_every, max_sweeps - self.n_recorded))
+            done, eqm = self.check_converged(mean_error, var_error, min_sweeps)
+            if done:
+                break
+        return eqm
 
     def get_infected(self):
         """
-            Class method to calculate the fraction
+            Class method to calculate the number
             of infected sites in the SIRS model.
         """
-        infected = 0
-        for i in range(self.size[0]):
-            for j in range(self.size[1]):
-                if self.lattice[i, j] == 0:
-                    infected += 1
-        return (infected)
+        with INSTRUMENT.timer("measurement"):
+            return int(self.counts[1])
 
     def get_infected_var(self, observables):
         """
             A method to calculate the variance of a list
-            of observables.
+            of observables or of a RunningStats accumulator.
         """
+        if isinstance(observables, RunningStats):
+            return observables.var()
         return (np.var(observables))
 
     def get_avg_obs(self, observables):
         """
             A method to calculate the average of a list
-            of observables.
+            of observables or of a RunningStats accumulator.
         """
+        if isinstance(observables, RunningStats):
+            return observables.mean
         return np.mean(observables)
 
     def plot_phase_diagram(self, matrix, prob_step):
@@ -116,80 +393,67 @@ class SIRS(object):
             Phase diagram plotter - Each axis domain must be from
             0 to 1 i.e. probabilities.
         """
-        dp = prob_step
-        pmin = 0.0
-        pmax = 1.0 + dp
-        p1s_plot,p3s_plot = np.meshgrid(np.arange(pmin,pmax+dp,dp)-dp/2.,np.arange(pmin,pmax+dp,dp)-dp/2.)
-        plt.title('p1-p3 Phase Diagram with p2 = 0.5')
-        plt.xlabel('p1 (S --> I)')
-        plt.ylabel('p3 (R --> S)')
-        plt.pcolormesh(p1s_plot, p3s_plot, matrix, cmap='hot')
-        plt.axis([p1s_plot.min(),p1s_plot.max(),p3s_plot.min(),p3s_plot.max()])
-        plt.xticks(np.arange(pmin,pmax,0.1))
-        plt.yticks(np.arange(pmin,pmax,0.1))
-        plt.colorbar()
-        plt.savefig("phase_diagram.png")
-        plt.show()
+        # Imported here so simulations never load matplotlib.
+        import SIRS_plots
+        SIRS_plots.plot_phase_diagram(matrix, prob_step)
 
     def plot_variance_contour(self, matrix, prob_step):
         """
-            Phase diagram plotter - Each axis domain must be from
-            0 to 1 i.e. probabilities.
+            Variance contour plotter - Each axis domain must be
+            from 0 to 1 i.e. probabilities.
         """
-        dp = prob_step
-        pmin = 0.0
-        pmax = 1.0 + prob_step
-        p1s_plot,p3s_plot = np.meshgrid(np.arange(pmin,pmax+dp,dp)-dp/2.,np.arange(pmin,pmax+dp,dp)-dp/2.)
-        plt.title('Variance Contour Plot Vs. p1, p3 (p2 = 0.5)')
-        plt.xlabel('p1 (S --> I)')
-        plt.ylabel('p3 (R --> S)')
-        plt.pcolormesh(p1s_plot, p3s_plot, matrix, cmap='hot')
-        plt.axis([p1s_plot.min(),p1s_plot.max(),p3s_plot.min(),p3s_plot.max()])
-        plt.xticks(np.arange(pmin,pmax,0.1))
-        plt.yticks(np.arange(pmin,pmax,0.1))
-        plt.colorbar()
-        plt.savefig("variance_contour.png")
-        plt.show()
+        import SIRS_plots
+        SIRS_plots.plot_variance_contour(matrix, prob_step)
 
     def plot_figure(self, x_data, var_data, error_data):
         """
             Method to plot the variance of
             the SIRS model.
         """
-        plt.title('Variance of <I>/N (p3 = p2 = 0.5)')
-        plt.xlabel('p1 (S --> I)')
-        plt.ylabel('Variance')
-        plt.errorbar(x_data, var_data, yerr = error_data)
-        plt.savefig("variance_plot.png")
-        plt.show()
+        import SIRS_plots
+        SIRS_plots.plot_figure(x_data, var_data, error_data)
 
-    def bootstrap(self, psis, samples):
+    def bootstrap(self, psis, samples, chunk_size=None):
         """
             Bootstrap method for generating error
             values assocaited with the variance of
             infected sites.
         """
-        # Bootstrap resampling.
-        error_data = []
-        for i in range(samples):
-            sampling_data = []
-            for j in range(len(psis)):
-                r = np.random.randint(0, len(psis))
-                sampling_data.append(psis[r])
-            error_data.append(self.get_infected_var(sampling_data) / (self.size[0] * self.size[1]))
+        # Bootstrap resampling, all resamples drawn at once.
+        with INSTRUMENT.timer("statistics"):
+            error_data = bootstrap_variances(psis, samples, self.rng, chunk_size) \
+                / (self.size[0] * self.size[1])
         # Finding overall error.
-        avg_error_sq = (sum(error_data) / len(error_data))**2
-        sq_errors = [val**2 for val in error_data]
-        avg_sq_error =  sum(sq_errors) / len(sq_errors)
-        return (math.sqrt(avg_sq_error - avg_error_sq))
+        avg_error_sq = np.mean(error_data)**2
+        avg_sq_error = np.mean(error_data**2)
+        return (math.sqrt(max(avg_sq_error - avg_error_sq, 0.0)))
+
+    def jackknife(self, psis, n_blocks=20):
+        """
+            Blocked jackknife error of the variance of
+            infected sites, for autocorrelated data.
+        """
+        with INSTRUMENT.timer("statistics"):
+            return jackknife_variance_error(psis, n_blocks) / \
+                (self.size[0] * self.size[1])
+
+    def advance(self, it_per_sweep):
+        """
+            Advances the simulation by one animation frame of
+            it_per_sweep site updates.
+        """
+        if self.scheme == "sequential":
+            self.update(it_per_sweep)
+        else:
+            # The other schemes advance whole sweeps at a time.
+            self.sweep(max(1, it_per_sweep // (self.size[0] * self.size[1])))
 
     def animate(self, *args):
         """
             Creates, saves and returns image of the current state of
             SIRS lattice for the FuncAnimation class.
         """
-        for i in range(self.it_per_sweep):
-            self.update_SIRS()
+        self.advance(self.it_per_sweep)
         self.image.set_array(self.lattice)
         return self.image,
 
@@ -198,9 +462,16 @@ class SIRS(object):
             Used in partnership with the tester file
             to run the simulation.
         """
-        self.figure = plt.figure()
-        self.it_per_sweep = it_per_sweep
-        self.image = plt.imshow(self.lattice, cmap='jet', animated=True)
-        self.animation = animation.FuncAnimation(self.figure, self.animate, repeat=False, frames=sweeps, interval=50, blit=True)
-        plt.colorbar(ticks=np.linspace(-1, 1, 3))
-        plt.show()
+        import SIRS_plots
+        SIRS_plots.run_animation(self, sweeps, it_per_sweep)
+
+    def export_video(self, path, sweeps, it_per_sweep, every=1, scale=1, fps=25):
+        """
+            Headless version of run_animation, streams frames to
+            a video file (via ffmpeg) or a directory of frames,
+            keeping one frame in every.
+        """
+        import renderer
+        return renderer.export(lambda: self.advance(it_per_sweep),
+                               lambda: self.lattice, renderer.SIRS_COLOURS,
+                               path, sweeps, every=every, scale=scale, fps=fps)
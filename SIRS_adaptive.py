@@ -0,0 +1,164 @@
+import numpy as np
+from SIRS_sweeps import heatmap_point
+from sweeper import run_tasks
+
+
+class AdaptiveGrid(object):
+    def __init__(self, task, p_step, coarse=8, tolerance=0.2):
+        """
+            Adaptive (p1, p3) phase diagram. Starts on a coarse
+            grid and splits only the cells whose corners differ
+            by more than tolerance (of the largest value seen)
+            in <I>/N or Var(I)/N, or straddle the absorbing
+            phase, down to the p_step grid of the uniform
+            heatmap. Points are stored sparsely, keyed by their
+            (p1, p3) indices on the p_step grid.
+
+            Attributes:
+            task = task (dict), heatmap_point task without p1,
+                   p3 (size, ini, p2, eqm_sweeps, sweeps, scheme).
+            p_step = p_step (float), finest probability step.
+            coarse = coarse (int), spacing of the starting grid
+                     in p_step units.
+            tolerance = tolerance (float), relative change across
+                        a cell that gets it split.
+        """
+        self.task = task
+        self.p_step = p_step
+        self.n = int(round(1.0 / p_step)) + 1
+        self.coarse = coarse
+        self.tolerance = tolerance
+        # (i, j) -> (psi, var).
+        self.points = {}
+        # Cells that were not split, (i0, i1, j0, j1) corners.
+        self.leaves = []
+        self.level = 0
+
+    def probabilities(self):
+        """
+            p1 (and p3) value of every index of the fine grid.
+        """
+        return np.arange(self.n) * self.p_step
+
+    def evaluate(self, indices, entropy, workers=None, store=None):
+        """
+            Runs heatmap_point for the new points of indices,
+            in parallel, taking finished ones from the
+            checkpoint store. Each refinement level has its
+            own random streams spawned from entropy.
+        """
+        indices = [index for index in indices if index not in self.points]
+        p1s = self.probabilities()
+        tasks = []
+        for i, j in indices:
+            task = dict(self.task)
+            task.update({"p1": float(p1s[i]), "p3": float(p1s[j]), "index": (i, j)})
+            tasks.append(task)
+        skip = []
+        for k in range(len(tasks)):
+            i, j = tasks[k]["index"]
+            if store is not None and store.done([i, j]):
+                self.points[(i, j)] = tuple(store.get([i, j]))
+                skip.append(k)
+        for k, (psi, var) in run_tasks(heatmap_point, tasks, workers=workers,
+                                       seed=[entropy, self.level], skip=skip):
+            i, j = tasks[k]["index"]
+            print(tasks[k]["p1"], tasks[k]["p3"])
+            self.points[(i, j)] = (psi, var)
+            if store is not None:
+                store.save([i, j], [psi, var])
+        self.level += 1
+
+    def needs_split(self, cell, scale):
+        """
+            Checks if the corner values of a cell differ by
+            more than the tolerance, or if some corners are
+            absorbing (psi = 0) and others not.
+        """
+        i0, i1, j0, j1 = cell
+        if i1 - i0 <= 1 and j1 - j0 <= 1:
+            return False
+        corners = np.array([self.points[(i, j)] for i in (i0, i1) for j in (j0, j1)])
+        if np.any(corners[:, 0] == 0) and np.any(corners[:, 0] != 0):
+            return True
+        spread = corners.max(axis=0) - corners.min(axis=0)
+        return bool(np.any(spread > self.tolerance * scale))
+
+    def split(self, cell):
+        """
+            Four (or two) sub-cells of a cell, halving each side
+            that is longer than one step.
+        """
+        i0, i1, j0, j1 = cell
+        i_edges = [i0, (i0 + i1) // 2, i1] if i1 - i0 > 1 else [i0, i1]
+        j_edges = [j0, (j0 + j1) // 2, j1] if j1 - j0 > 1 else [j0, j1]
+        return [(i_edges[a], i_edges[a + 1], j_edges[b], j_edges[b + 1])
+                for a in range(len(i_edges) - 1) for b in range(len(j_edges) - 1)]
+
+    def run(self, seed=None, workers=None, store=None):
+        """
+            Evaluates the coarse grid and refines it level by
+            level until no cell needs splitting.
+        """
+        entropy = np.random.SeedSequence(seed).entropy
+        edges = sorted(set(range(0, self.n, self.coarse)) | {self.n - 1})
+        cells = [(edges[a], edges[a + 1], edges[b], edges[b + 1])
+                 for a in range(len(edges) - 1) for b in range(len(edges) - 1)]
+        self.evaluate([(i, j) for i in edges for j in edges], entropy, workers, store)
+        while len(cells) > 0:
+            scale = np.abs(np.array(list(self.points.values()))).max(axis=0)
+            split = []
+            for cell in cells:
+                if self.needs_split(cell, scale):
+                    split += self.split(cell)
+                else:
+                    self.leaves.append(cell)
+            new = set()
+            for i0, i1, j0, j1 in split:
+                new.update([(i0, j0), (i0, j1), (i1, j0), (i1, j1)])
+            if len(new) > 0:
+                self.evaluate(sorted(new), entropy, workers, store)
+            cells = split
+
+    def matrices(self):
+        """
+            Dense (p3, p1) matrices of <I>/N and Var(I)/N for
+            plot_phase_diagram and plot_variance_contour. Points
+            inside unsplit cells are bilinear interpolations of
+            the cell corners.
+        """
+        phase = np.zeros((self.n, self.n))
+        variance = np.zeros((self.n, self.n))
+        for i0, i1, j0, j1 in self.leaves:
+            u = (np.arange(i0, i1 + 1) - i0) / max(i1 - i0, 1)
+            v = (np.arange(j0, j1 + 1) - j0) / max(j1 - j0, 1)
+            for matrix, k in ((phase, 0), (variance, 1)):
+                f00 = self.points[(i0, j0)][k]
+                f10 = self.points[(i1, j0)][k]
+                f01 = self.points[(i0, j1)][k]
+                f11 = self.points[(i1, j1)][k]
+                # Rows are p3, columns are p1.
+                matrix[j0:j1 + 1, i0:i1 + 1] = \
+                    np.outer(1 - v, 1 - u) * f00 + np.outer(1 - v, u) * f10 + \
+                    np.outer(v, 1 - u) * f01 + np.outer(v, u) * f11
+        for (i, j), (psi, var) in self.points.items():
+            phase[j, i] = psi
+            variance[j, i] = var
+        return phase, variance
+
+    def save(self, results):
+        """
+            Writes the sparse points to a ResultStore, with
+            the rendered dense matrices.
+        """
+        indices = np.array(sorted(self.points), dtype=np.int64)
+        values = np.array([self.points[tuple(index)] for index in indices])
+        p1s = self.probabilities()
+        results.save("points", indices)
+        results.save("p1", p1s)
+        results.save("p3", p1s)
+        results.save("point_phase", values[:, 0])
+        results.save("point_variance", values[:, 1])
+        phase, variance = self.matrices()
+        results.save("phase", phase)
+        results.save("variance", variance)
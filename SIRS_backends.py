@@ -0,0 +1,36 @@
+import SIRS_kernels
+from backends import register
+
+
+@register("sirs", "python")
+class PythonSIRS(object):
+    """
+        Interpreted random sequential SIRS kernel (reference).
+    """
+    available = True
+    sequential = staticmethod(SIRS_kernels.run_python)
+    checkerboard = staticmethod(SIRS_kernels.checkerboard_python)
+    kmc = staticmethod(SIRS_kernels.kmc_python)
+
+
+@register("sirs", "numpy")
+class NumpySIRS(object):
+    """
+        Vectorised random sequential SIRS kernel.
+    """
+    available = True
+    sequential = staticmethod(SIRS_kernels.run_numpy)
+    checkerboard = staticmethod(SIRS_kernels.checkerboard_numpy)
+    # Events happen one at a time, there is no vectorised form.
+    kmc = staticmethod(SIRS_kernels.kmc_python)
+
+
+@register("sirs", "numba")
+class NumbaSIRS(object):
+    """
+        Numba compiled random sequential SIRS kernel.
+    """
+    available = SIRS_kernels.compiled_sequential_kernel is not None
+    sequential = staticmethod(SIRS_kernels.run_numba)
+    checkerboard = staticmethod(SIRS_kernels.checkerboard_numba)
+    kmc = staticmethod(SIRS_kernels.kmc_numba)
@@ -0,0 +1,542 @@
+import math
+import weakref
+import numpy as np
+
+try:
+    from numba import njit, prange
+    from numba.extending import register_jitable
+except ImportError:
+    njit = None
+    prange = range
+
+    def register_jitable(func):
+        return func
+
+# Python list forms of neighbour tables, id -> (weakref, list).
+TABLE_LISTS = {}
+
+
+def table_list(neighbours):
+    """
+        Neighbour table as nested Python lists for the
+        interpreted kernels, converted once per table.
+        None (periodic von Neumann) is passed through.
+    """
+    if neighbours is None:
+        return None
+    entry = TABLE_LISTS.get(id(neighbours))
+    if entry is None or entry[0]() is not neighbours:
+        entry = (weakref.ref(neighbours), neighbours.tolist())
+        TABLE_LISTS[id(neighbours)] = entry
+    return entry[1]
+
+
+@register_jitable
+def degree(neighbours):
+    """
+        Number of neighbours of a site, 4 for a periodic
+        von Neumann lattice (neighbours None).
+    """
+    if neighbours is None:
+        return 4
+    return len(neighbours[0])
+
+
+@register_jitable
+def neighbour(neighbours, height, width, site, m):
+    """
+        m-th neighbour of a flat site, read from the table
+        or, if neighbours is None, the periodic von Neumann
+        neighbour north, east, south or west.
+    """
+    if neighbours is None:
+        i = site // width
+        j = site - i * width
+        if m == 0:
+            return ((i - 1 + height) % height) * width + j
+        if m == 1:
+            return i * width + (j + 1) % width
+        if m == 2:
+            return ((i + 1) % height) * width + j
+        return i * width + (j - 1 + width) % width
+    return neighbours[site][m]
+
+
+@register_jitable
+def infected_neighbour(lattice, neighbours, height, width, site):
+    """
+        Checks if a flat site has an infected neighbour.
+    """
+    if neighbours is None:
+        i = site // width
+        j = site - i * width
+        return lattice[((i - 1 + height) % height) * width + j] == 0 or \
+            lattice[i * width + (j + 1) % width] == 0 or \
+            lattice[((i + 1) % height) * width + j] == 0 or \
+            lattice[i * width + (j - 1 + width) % width] == 0
+    row = neighbours[site]
+    for m in range(len(row)):
+        if lattice[row[m]] == 0:
+            return True
+    return False
+
+
+def sequential_kernel(lattice, counts, neighbours, height, width, sites, rands,
+                      p1, p2, p3):
+    """
+        Random sequential SIRS updates of a flattened
+        lattice for pre-drawn sites and uniforms, one
+        uniform per visited site, neighbours read from the
+        topology table (None wraps periodic von Neumann
+        indices). counts[state + 1] is kept equal to
+        the number of sites in each state.
+        Returns the number of sites that changed state.
+        Works on NumPy arrays when compiled and on Python
+        lists otherwise.
+    """
+    changes = 0
+    for k in range(len(sites)):
+        site = sites[k]
+        state = lattice[site]
+        # Susceptible site with an infected neighbour.
+        if state == -1:
+            if rands[k] <= p1 and infected_neighbour(lattice, neighbours, height, width, site):
+                lattice[site] = 0
+                counts[0] -= 1
+                counts[1] += 1
+                changes += 1
+        # Infected site recovers.
+        elif state == 0:
+            if rands[k] <= p2:
+                lattice[site] = 1
+                counts[1] -= 1
+                counts[2] += 1
+                changes += 1
+        # Recovered site loses immunity.
+        elif state == 1:
+            if rands[k] <= p3:
+                lattice[site] = -1
+                counts[2] -= 1
+                counts[0] += 1
+                changes += 1
+    return changes
+
+
+if njit is not None:
+    compiled_sequential_kernel = njit(cache=True)(sequential_kernel)
+else:
+    compiled_sequential_kernel = None
+
+
+def run_python(lattice, counts, neighbours, sites, rands, p1, p2, p3):
+    """
+        Interpreted sequential kernel, run on Python lists
+        because indexing them is much faster than arrays.
+    """
+    height, width = lattice.shape
+    flat = lattice.reshape(-1).tolist()
+    flat_counts = counts.tolist()
+    changes = sequential_kernel(flat, flat_counts, table_list(neighbours), height, width,
+                                sites.tolist(), rands.tolist(), p1, p2, p3)
+    lattice[...] = np.reshape(flat, lattice.shape)
+    counts[...] = flat_counts
+    return changes
+
+
+def run_numba(lattice, counts, neighbours, sites, rands, p1, p2, p3):
+    """
+        Sequential kernel compiled by Numba.
+    """
+    height, width = lattice.shape
+    return compiled_sequential_kernel(lattice.reshape(-1), counts, neighbours, height,
+                                      width, sites, rands, p1, p2, p3)
+
+
+def neighbour_rows(neighbours, shape, sites):
+    """
+        (k, n) flat neighbours of n flat sites, from the
+        table or by wrapping periodic von Neumann indices.
+    """
+    if neighbours is not None:
+        return neighbours[sites].T
+    height, width = shape
+    i, j = np.divmod(sites, width)
+    return np.stack((((i - 1) % height) * width + j,
+                     i * width + (j + 1) % width,
+                     ((i + 1) % height) * width + j,
+                     i * width + (j - 1) % width))
+
+
+def run_numpy(lattice, counts, neighbours, sites, rands, p1, p2, p3):
+    """
+        Vectorised sequential kernel giving exactly the same
+        result as the site by site loop. The batch is cut
+        into runs of updates that do not read a site written
+        earlier in the same run (no repeated or adjacent
+        sites), and each run is applied with array operations.
+        Runs are about sqrt(N) long, so this pays off on
+        large lattices.
+    """
+    flat = lattice.reshape(-1)
+    n_updates = len(sites)
+    window = max(16, int(2 * math.sqrt(flat.size)))
+    # Position in the current window of the first update of a site.
+    owner = np.full(flat.size, window, dtype=np.int64)
+    start = 0
+    changes = 0
+    while start < n_updates:
+        window_sites = sites[start:start + window]
+        order = np.arange(window_sites.size)
+        np.minimum.at(owner, window_sites, order)
+        window_neighbours = neighbour_rows(neighbours, lattice.shape, window_sites)
+        # Updates reading a site written earlier in the window.
+        clash = (owner[window_sites] < order) | \
+            np.any(owner[window_neighbours] < order, axis=0)
+        owner[window_sites] = window
+        if np.any(clash):
+            run = int(np.argmax(clash))
+        else:
+            run = window_sites.size
+
+        run_sites = window_sites[:run]
+        run_rands = rands[start:start + run]
+        state = flat[run_sites]
+        exposed = np.any(flat[window_neighbours[:, :run]] == 0, axis=0)
+        to_infected = run_sites[(state == -1) & exposed & (run_rands <= p1)]
+        to_recovered = run_sites[(state == 0) & (run_rands <= p2)]
+        to_susceptible = run_sites[(state == 1) & (run_rands <= p3)]
+        flat[to_infected] = 0
+        flat[to_recovered] = 1
+        flat[to_susceptible] = -1
+        counts[0] += to_susceptible.size - to_infected.size
+        counts[1] += to_infected.size - to_recovered.size
+        counts[2] += to_recovered.size - to_susceptible.size
+        changes += to_infected.size + to_recovered.size + to_susceptible.size
+        start += run
+    return changes
+
+
+def exposed_sites(lattice, neighbours):
+    """
+        Boolean lattice of the sites with an infected
+        neighbour.
+    """
+    if neighbours is None:
+        infected = lattice == 0
+        return np.roll(infected, 1, axis=0) | np.roll(infected, -1, axis=0) \
+            | np.roll(infected, 1, axis=1) | np.roll(infected, -1, axis=1)
+    infected = lattice.reshape(-1) == 0
+    # One take per neighbour column, much faster than a 2D gather.
+    exposed = np.take(infected, neighbours[:, 0])
+    for m in range(1, neighbours.shape[1]):
+        exposed |= np.take(infected, neighbours[:, m])
+    return exposed.reshape(lattice.shape)
+
+
+def synchronous_step(lattice, counts, neighbours, rands, p1, p2, p3, sites=None):
+    """
+        One synchronous SIRS step of a 2D lattice in place.
+        Every site is updated at once from the old state,
+        using one uniform per site: S with an infected
+        neighbour becomes I with probability p1, I becomes
+        R with p2 and R becomes S with p3. If sites
+        (boolean mask) is given only those sites are
+        updated.
+    """
+    infected = lattice == 0
+    exposed = exposed_sites(lattice, neighbours)
+    to_infected = (lattice == -1) & exposed & (rands <= p1)
+    to_recovered = infected & (rands <= p2)
+    to_susceptible = (lattice == 1) & (rands <= p3)
+    if sites is not None:
+        to_infected &= sites
+        to_recovered &= sites
+        to_susceptible &= sites
+    lattice[to_infected] = 0
+    lattice[to_recovered] = 1
+    lattice[to_susceptible] = -1
+    n_i = np.count_nonzero(to_infected)
+    n_r = np.count_nonzero(to_recovered)
+    n_s = np.count_nonzero(to_susceptible)
+    counts[0] += n_s - n_i
+    counts[1] += n_i - n_r
+    counts[2] += n_r - n_s
+    return n_i + n_r + n_s
+
+
+def colour_kernel(lattice, neighbours, height, width, rands, colour, attempt, p1, p2, p3):
+    """
+        Half-step of the checkerboard scheme on one colour,
+        (i + j) % 2 == colour, of a flattened lattice. Each
+        site of the colour is attempted with probability
+        attempt (rands[site] < attempt) and then updated
+        with the uniform rands[site] / attempt. The von
+        Neumann neighbours are all of the other colour (see
+        Topology.is_bipartite), so the order of the updates
+        does not matter and rows are split across threads
+        when compiled.
+        Returns the number of S -> I, I -> R and R -> S
+        changes.
+    """
+    n_i = 0
+    n_r = 0
+    n_s = 0
+    for i in prange(height):
+        for j in range((i + colour) % 2, width, 2):
+            site = i * width + j
+            if rands[site] >= attempt:
+                continue
+            rand = rands[site] / attempt
+            state = lattice[site]
+            # Susceptible site with an infected neighbour.
+            if state == -1:
+                if rand <= p1 and infected_neighbour(lattice, neighbours, height, width,
+                                                     site):
+                    lattice[site] = 0
+                    n_i += 1
+            # Infected site recovers.
+            elif state == 0:
+                if rand <= p2:
+                    lattice[site] = 1
+                    n_r += 1
+            # Recovered site loses immunity.
+            elif state == 1:
+                if rand <= p3:
+                    lattice[site] = -1
+                    n_s += 1
+    return n_i, n_r, n_s
+
+
+if njit is not None:
+    compiled_colour_kernel = njit(parallel=True, cache=True)(colour_kernel)
+else:
+    compiled_colour_kernel = None
+
+
+def checkerboard_python(lattice, counts, neighbours, rands, colour, attempt,
+                        p1, p2, p3):
+    """
+        Interpreted checkerboard half-step on Python lists.
+    """
+    height, width = lattice.shape
+    flat = lattice.reshape(-1).tolist()
+    n_i, n_r, n_s = colour_kernel(flat, table_list(neighbours), height, width,
+                                  rands.reshape(-1).tolist(), colour, attempt, p1, p2, p3)
+    lattice[...] = np.reshape(flat, lattice.shape)
+    counts[0] += n_s - n_i
+    counts[1] += n_i - n_r
+    counts[2] += n_r - n_s
+    return n_i + n_r + n_s
+
+
+def checkerboard_numba(lattice, counts, neighbours, rands, colour, attempt,
+                       p1, p2, p3):
+    """
+        Checkerboard half-step compiled by Numba, threaded
+        over rows (NUMBA_NUM_THREADS sets the thread count).
+    """
+    height, width = lattice.shape
+    n_i, n_r, n_s = compiled_colour_kernel(lattice.reshape(-1), neighbours, height, width,
+                                           rands.reshape(-1), colour, attempt,
+                                           p1, p2, p3)
+    counts[0] += n_s - n_i
+    counts[1] += n_i - n_r
+    counts[2] += n_r - n_s
+    return n_i + n_r + n_s
+
+
+def checkerboard_numpy(lattice, counts, neighbours, rands, colour, attempt,
+                       p1, p2, p3):
+    """
+        Checkerboard half-step as a masked synchronous step
+        of the attempted sites of one colour.
+    """
+    sites = (np.indices(lattice.shape).sum(axis=0) % 2 == colour) & (rands < attempt)
+    return synchronous_step(lattice, counts, neighbours, rands / attempt, p1, p2, p3,
+                            sites=sites)
+
+
+def kmc_classes(lattice, neighbours):
+    """
+        Sites that can change state, grouped for the
+        rejection-free scheme: class 0 is S with an infected
+        neighbour, class 1 is I and class 2 is R. Returns
+        flat arrays (site_class, position, members, sizes),
+        site_class is -1 for sites in no class and members
+        holds class c in members[c * N:c * N + sizes[c]].
+    """
+    infected = lattice == 0
+    exposed = exposed_sites(lattice, neighbours)
+    n_sites = lattice.size
+    site_class = np.full(n_sites, -1, dtype=np.int64)
+    position = np.zeros(n_sites, dtype=np.int64)
+    members = np.zeros(3 * n_sites, dtype=np.int64)
+    sizes = np.zeros(3, dtype=np.int64)
+    for c, in_class in enumerate(((lattice == -1) & exposed, infected, lattice == 1)):
+        sites = np.flatnonzero(in_class)
+        site_class[sites] = c
+        position[sites] = np.arange(sites.size)
+        members[c * n_sites:c * n_sites + sites.size] = sites
+        sizes[c] = sites.size
+    return site_class, position, members, sizes
+
+
+def kmc_kernel(lattice, counts, neighbours, height, width, site_class, position,
+               members, sizes, n_mobile, p1, p2, p3, rands, index, end):
+    """
+        Rejection-free (n-fold way) random sequential SIRS
+        on a flattened lattice. Each event draws the number
+        of random sequential attempts it took (geometric with
+        the total flip probability per attempt), a class in
+        proportion to size * probability and a site of that
+        class, using three uniforms from rands[index:]. Runs
+        until the next event would come after end attempts
+        or rands runs out, returning (index, attempts done,
+        events).
+        Works on NumPy arrays when compiled and on Python
+        lists otherwise.
+    """
+    n_sites = len(site_class)
+    time = 0
+    events = 0
+    while index + 3 <= len(rands):
+        rates = (sizes[0] * p1, sizes[1] * p2, sizes[2] * p3)
+        total = rates[0] + rates[1] + rates[2]
+        # Nothing can change any more.
+        if total == 0:
+            return index, end, events
+        flip = total / n_mobile
+        if flip >= 1.0:
+            wait = 1
+        else:
+            wait = int(math.log(1.0 - rands[index]) / math.log(1.0 - flip)) + 1
+        # Attempts are memoryless, so the wait past end is redrawn later.
+        if time + wait > end:
+            return index + 1, end, events
+        time += wait
+        events += 1
+        x = rands[index + 1] * total
+        if x < rates[0]:
+            c = 0
+        elif x < rates[0] + rates[1]:
+            c = 1
+        else:
+            c = 2
+        k = min(int(rands[index + 2] * sizes[c]), sizes[c] - 1)
+        index += 3
+        site = members[c * n_sites + k]
+        # Take the site out of its class.
+        last = members[c * n_sites + sizes[c] - 1]
+        members[c * n_sites + k] = last
+        position[last] = k
+        sizes[c] -= 1
+        site_class[site] = -1
+        if c == 0:
+            # S -> I, susceptible neighbours become exposed.
+            lattice[site] = 0
+            counts[0] -= 1
+            counts[1] += 1
+            members[n_sites + sizes[1]] = site
+            position[site] = sizes[1]
+            site_class[site] = 1
+            sizes[1] += 1
+            for m in range(degree(neighbours)):
+                nb = neighbour(neighbours, height, width, site, m)
+                if lattice[nb] == -1 and site_class[nb] == -1:
+                    members[sizes[0]] = nb
+                    position[nb] = sizes[0]
+                    site_class[nb] = 0
+                    sizes[0] += 1
+        elif c == 1:
+            # I -> R, exposed neighbours may lose their last infected neighbour.
+            lattice[site] = 1
+            counts[1] -= 1
+            counts[2] += 1
+            members[2 * n_sites + sizes[2]] = site
+            position[site] = sizes[2]
+            site_class[site] = 2
+            sizes[2] += 1
+            for m in range(degree(neighbours)):
+                nb = neighbour(neighbours, height, width, site, m)
+                if site_class[nb] == 0:
+                    if not infected_neighbour(lattice, neighbours, height, width, nb):
+                        last = members[sizes[0] - 1]
+                        members[position[nb]] = last
+                        position[last] = position[nb]
+                        sizes[0] -= 1
+                        site_class[nb] = -1
+        else:
+            # R -> S, exposed if an infected neighbour is left.
+            lattice[site] = -1
+            counts[2] -= 1
+            counts[0] += 1
+            if infected_neighbour(lattice, neighbours, height, width, site):
+                members[sizes[0]] = site
+                position[site] = sizes[0]
+                site_class[site] = 0
+                sizes[0] += 1
+    return index, time, events
+
+
+if njit is not None:
+    compiled_kmc_kernel = njit(cache=True)(kmc_kernel)
+else:
+    compiled_kmc_kernel = None
+
+
+def kmc_blocks(kernel, state, n_mobile, p1, p2, p3, rands, index, end, refill):
+    """
+        Runs kmc_kernel on state (the arguments before
+        n_mobile) until end attempts are done, taking a new
+        block of uniforms from refill() whenever rands runs
+        out. Returns (rands, index, attempts, events).
+    """
+    attempts = 0
+    events = 0
+    while True:
+        index, time, n_events = kernel(*state, n_mobile, p1, p2, p3, rands, index,
+                                       end - attempts)
+        attempts += time
+        events += n_events
+        if attempts >= end or refill is None:
+            return rands, index, attempts, events
+        rands = refill()
+        index = 0
+
+
+def kmc_python(lattice, counts, neighbours, classes, n_mobile, p1, p2, p3, rands,
+               index, end, refill=None):
+    """
+        Interpreted rejection-free kernel, run on Python
+        lists. classes is the kmc_classes tuple, updated in
+        place. The arrays are converted to lists once per
+        call, so refill should be given to run a whole sweep
+        per call.
+    """
+    flat = lattice.reshape(-1).tolist()
+    lists = [array.tolist() for array in classes]
+    flat_counts = counts.tolist()
+    state = [flat, flat_counts, table_list(neighbours)] + list(lattice.shape) + lists
+    # Blocks of uniforms as drawn, the kernel reads them as lists.
+    blocks = [rands]
+
+    def next_block():
+        blocks.append(refill())
+        return blocks[-1].tolist()
+    result = kmc_blocks(kmc_kernel, state, n_mobile, p1, p2, p3, rands.tolist(), index,
+                        end, None if refill is None else next_block)
+    lattice[...] = np.reshape(flat, lattice.shape)
+    counts[...] = flat_counts
+    for array, values in zip(classes, lists):
+        array[...] = values
+    return (blocks[-1],) + result[1:]
+
+
+def kmc_numba(lattice, counts, neighbours, classes, n_mobile, p1, p2, p3, rands,
+              index, end, refill=None):
+    """
+        Rejection-free kernel compiled by Numba.
+    """
+    state = (lattice.reshape(-1), counts, neighbours) + lattice.shape + tuple(classes)
+    return kmc_blocks(compiled_kmc_kernel, state, n_mobile, p1, p2, p3, rands, index,
+                      end, refill)
@@ -0,0 +1,79 @@
+import numpy as np
+import matplotlib.pyplot as plt
+import matplotlib.animation as animation
+
+
+def plot_probability_grid(matrix, prob_step, title, path):
+    """
+        Plots a (p3, p1) matrix over the probability grid,
+        each axis domain must be from 0 to 1.
+    """
+    dp = prob_step
+    pmin = 0.0
+    pmax = 1.0 + dp
+    p1s_plot,p3s_plot = np.meshgrid(np.arange(pmin,pmax+dp,dp)-dp/2.,np.arange(pmin,pmax+dp,dp)-dp/2.)
+    plt.title(title)
+    plt.xlabel('p1 (S --> I)')
+    plt.ylabel('p3 (R --> S)')
+    plt.pcolormesh(p1s_plot, p3s_plot, matrix, cmap='hot')
+    plt.axis([p1s_plot.min(),p1s_plot.max(),p3s_plot.min(),p3s_plot.max()])
+    plt.xticks(np.arange(pmin,pmax,0.1))
+    plt.yticks(np.arange(pmin,pmax,0.1))
+    plt.colorbar()
+    plt.savefig(path)
+    plt.show()
+
+
+def plot_phase_diagram(matrix, prob_step):
+    """
+        Phase diagram plotter of <I>/N.
+    """
+    plot_probability_grid(matrix, prob_step, 'p1-p3 Phase Diagram with p2 = 0.5',
+                          "phase_diagram.png")
+
+
+def plot_variance_contour(matrix, prob_step):
+    """
+        Phase diagram plotter of Var(I)/N.
+    """
+    plot_probability_grid(matrix, prob_step, 'Variance Contour Plot Vs. p1, p3 (p2 = 0.5)',
+                          "variance_contour.png")
+
+
+def plot_figure(x_data, var_data, error_data):
+    """
+        Plots the variance of the SIRS model along
+        the p3 = 0.5 cut.
+    """
+    plt.title('Variance of <I>/N (p3 = p2 = 0.5)')
+    plt.xlabel('p1 (S --> I)')
+    plt.ylabel('Variance')
+    plt.errorbar(x_data, var_data, yerr = error_data)
+    plt.savefig("variance_plot.png")
+    plt.show()
+
+
+def plot_immunity(im_fracs, infected_fracs, im_errors):
+    """
+        Plots the infected fraction against the
+        immune fraction.
+    """
+    plt.title('Infected Sites vs. Immune Fraction')
+    plt.xlabel('Immune Fraction')
+    plt.ylabel('Infected Fraction')
+    plt.errorbar(im_fracs, infected_fracs, yerr = im_errors)
+    plt.savefig("immunity_plot.png")
+    plt.show()
+
+
+def run_animation(simulation, sweeps, it_per_sweep):
+    """
+        Shows a live animation of a SIRS simulation,
+        it_per_sweep site updates per frame.
+    """
+    simulation.figure = plt.figure()
+    simulation.it_per_sweep = it_per_sweep
+    simulation.image = plt.imshow(simulation.lattice, cmap='jet', animated=True)
+    simulation.animation = animation.FuncAnimation(simulation.figure, simulation.animate, repeat=False, frames=sweeps, interval=50, blit=True)
+    plt.colorbar(ticks=np.linspace(-1, 1, 3))
+    plt.show()
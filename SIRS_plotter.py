@@ -1,16 +1,46 @@
 from SIRS import SIRS
+from SIRS_sweeps import heatmap_point, immunity_point, cut_variance
+from SIRS_adaptive import AdaptiveGrid
+from sweeper import run_tasks
+from checkpoint import Checkpoint
+from result_store import ResultStore
+from instrument import INSTRUMENT
 import numpy as np
-import sys
-import matplotlib.pyplot as plt
+import argparse
 import math
 
 def main():
-    if len(sys.argv) != 2:
-        print("Wrong number of arguments.")
-        print("Usage: " + sys.argv[0] + " <parameters file>")
-        quit()
-    else:
-        infile_parameters = sys.argv[1]
+    parser = argparse.ArgumentParser()
+    parser.add_argument("parameters", help="parameters file")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for the heatmap and immunity "
+                             "plots (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="root seed of the per point random streams")
+    parser.add_argument("--resume", action="store_true",
+                        help="skip grid points already in the checkpoint")
+    parser.add_argument("--checkpoint", default=None,
+                        help="checkpoint file (default: <desired plot>.ckpt)")
+    parser.add_argument("--mean-error", type=float, default=0.001,
+                        help="target standard error of <I>/N when the "
+                             "equilibrium sweeps are auto")
+    parser.add_argument("--var-error", type=float, default=0.01,
+                        help="target standard error of Var(I)/N when the "
+                             "equilibrium sweeps are auto")
+    parser.add_argument("--adaptive", type=int, default=None, metavar="COARSE",
+                        help="refine the heatmap adaptively from a grid COARSE "
+                             "prob steps apart")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative change across a cell that refines it")
+    parser.add_argument("--instrument", default=None, metavar="PATH",
+                        help="write counters, phase timers and per point "
+                             "rates as JSON to PATH")
+    parser.add_argument("--profile", default=None, metavar="DIR",
+                        help="write cProfile stats of every grid point to DIR")
+    args = parser.parse_args()
+    if args.instrument is not None or args.profile is not None:
+        INSTRUMENT.enable(args.profile)
+    infile_parameters = args.parameters
 
     # Open input file and assinging parameters.
     with open(infile_parameters, "r") as input_file:
@@ -23,11 +53,61 @@ def main():
         ini_cond = str(items[2])     # Initial conditions.
         p2 = float(items[3])         # P(I --> R).
         p_step = float(items[4])     # Probability steps.
-        eqm_sweeps = int(items[5])   # Equilibrium sweeps.
+        # Equilibrium sweeps, "auto" detects them per run.
+        if items[5].strip() == "auto":
+            eqm_sweeps = None
+        else:
+            eqm_sweeps = int(items[5])
         sweeps = int(items[6])       # No. of sweeps.
+        # Update scheme, random sequential unless given.
+        if len(items) > 7:
+            scheme = items[7].strip()
+        else:
+            scheme = "sequential"
+    # The checkerboard cut still differs from random sequential, see SIRS_validation.
+    if scheme == "checkerboard":
+        parser.error("the checkerboard scheme is not validated for measurements, "
+                     "use sequential or kmc")
+
+    # Finished grid points are saved as they complete.
+    params = {"lattice_size": lattice_size, "desired_plot": desired_plot,
+              "ini": ini_cond, "p2": p2, "p_step": p_step,
+              "eqm_sweeps": eqm_sweeps, "sweeps": sweeps, "scheme": scheme,
+              "seed": args.seed}
+    # Runs stop once these errors are reached.
+    if eqm_sweeps is None:
+        params.update(mean_error=args.mean_error, var_error=args.var_error)
+    if args.adaptive is not None:
+        params.update(adaptive=args.adaptive, tolerance=args.tolerance)
+    store = Checkpoint(args.checkpoint or desired_plot + ".ckpt", params,
+                       resume=args.resume)
+    # Results are written to a binary store as points finish.
+    if args.resume:
+        store_mode = "a"
+    else:
+        store_mode = "w"
+
+    # Adaptive heatmap plot, only cells near the transition are refined.
+    if desired_plot == 'heatmap' and args.adaptive is not None:
+        grid = AdaptiveGrid({"size": lattice_size, "ini": ini_cond, "p2": p2,
+                             "eqm_sweeps": eqm_sweeps, "sweeps": sweeps,
+                             "scheme": scheme, "mean_error": args.mean_error,
+                             "var_error": args.var_error}, p_step, coarse=args.adaptive,
+                            tolerance=args.tolerance)
+        grid.run(seed=args.seed, workers=args.workers, store=store)
+        results = ResultStore("phase_data", attrs=params, mode=store_mode)
+        grid.save(results)
+        print(str(len(grid.points)) + " of " + str(grid.n**2) + " points simulated.")
+        phase_matrix, var_matrix = grid.matrices()
+
+        simulation = SIRS(size=lattice_size, ini=ini_cond,
+                          p1=0.0, p2=p2, p3=0.0)
+        # Plotting.
+        simulation.plot_phase_diagram(phase_matrix, p_step)
+        simulation.plot_variance_contour(var_matrix, p_step)
 
     # Heatmap plot.
-    if desired_plot == 'heatmap':
+    elif desired_plot == 'heatmap':
         # Initialising probability domains.
         p1s = np.arange(0.0, 1.0 + p_step, p_step)
         #print(p1s.size)
@@ -36,53 +116,51 @@ def main():
         phase_matrix = np.zeros((p1s.size, p3s.size))
         var_matrix = np.zeros((p1s.size, p3s.size))
 
-        # Simulation begins.
-        for p1 in p1s:
-            print(p1)
-            # Data storage.
-            psi_per_p1 = []
-            var_data = []
-            for p3 in p3s:
-                simulation = SIRS(size=lattice_size,
-                                    ini=ini_cond, p1=p1, p2=p2, p3=p3)
-                psi_per_p3 = []
-                # Sweep over lattice.
-                for sweep in range(sweeps):
-                    for j in range(simulation.size[0]*simulation.size[1]):
-                        simulation.update_SIRS()
-                    # Get data.
-                    if sweep >= eqm_sweeps and simulation.get_infected() != 0:
-                        psi_per_p3.append(simulation.get_infected())
-                    # Stop when absorbing state reached.
-                    elif sweep >= eqm_sweeps:
-                        break
-                # Data collection.
-                if len(psi_per_p3) != 0:
-                    psi_per_p1.append(simulation.get_avg_obs(
-                        psi_per_p3) / (simulation.size[0]*simulation.size[1]))
-                    var_data.append(simulation.get_infected_var(
-                        psi_per_p3) / (simulation.size[0]*simulation.size[1]))
-                else:
-                    psi_per_p1.append(0.0)
-                    var_data.append(0.0)
-
-            # Update matrix columns.
-            phase_matrix[:, int(p1*(p1s.size-1))] = psi_per_p1
-            var_matrix[:, int(p1*(p1s.size-1))] = var_data
+        # One independent task per (p1, p3) point.
+        tasks = []
+        for i in range(p1s.size):
+            for j in range(p3s.size):
+                tasks.append({"size": lattice_size, "ini": ini_cond,
+                              "p1": float(p1s[i]), "p2": p2, "p3": float(p3s[j]),
+                              "eqm_sweeps": eqm_sweeps, "sweeps": sweeps,
+                              "scheme": scheme, "mean_error": args.mean_error,
+                              "var_error": args.var_error, "index": (i, j)})
+
+        # Rows are p3, columns are p1.
+        results = ResultStore("phase_data", attrs=params, mode=store_mode)
+        results.save("p1", p1s)
+        results.save("p3", p3s)
+        results.create("phase", phase_matrix.shape)
+        results.create("variance", var_matrix.shape)
 
+        # Points finished by an earlier run.
+        skip = []
+        for k in range(len(tasks)):
+            i, j = tasks[k]["index"]
+            if store.done([i, j]):
+                phase_matrix[j, i], var_matrix[j, i] = store.get([i, j])
+                results.write("phase", (j, i), phase_matrix[j, i])
+                results.write("variance", (j, i), var_matrix[j, i])
+                skip.append(k)
+
+        # Simulation begins, results arrive in any order.
+        for k, (psi, var) in run_tasks(heatmap_point, tasks, workers=args.workers,
+                                       seed=args.seed, skip=skip):
+            i, j = tasks[k]["index"]
+            print(tasks[k]["p1"], tasks[k]["p3"])
+            # Rows are p3, columns are p1.
+            phase_matrix[j, i] = psi
+            var_matrix[j, i] = var
+            store.save([i, j], [psi, var])
+            results.write("phase", (j, i), psi)
+            results.write("variance", (j, i), var)
+
+        simulation = SIRS(size=lattice_size, ini=ini_cond,
+                          p1=0.0, p2=p2, p3=0.0)
         # Plotting.
         simulation.plot_phase_diagram(phase_matrix, p_step)
         simulation.plot_variance_contour(var_matrix, p_step)
 
-        # Writing to file.
-        np.savetxt("phase_data.dat", phase_matrix, fmt='%1.5f', delimiter=' ', 
-                    newline = '\n# p1 = [0.0, 0.025, ..., 1.0]' + ' p3 = [0.0, 0.025, ..., 1.0]\n',
-                    header = 'Phase Diagram Raw Data'
-                    )
-        np.savetxt("var_data.dat", var_matrix, fmt='%1.5f', delimiter=' ',
-                    newline = '\n# p1 = [0.0, 0.025, ..., 1.0]' + ' p3 = [0.0, 0.025, ..., 1.0\n',
-                    header = 'Phase Diagram Variance Raw Data'
-                    )
 
     # Variance cut plot.
     elif desired_plot == 'variance_plot':
@@ -92,31 +170,72 @@ def main():
         # Data storage.
         var_array = np.zeros(p1s.size)
         error_array = np.zeros(p1s.size)
+        # Sweeps between saves of the live state.
+        state_every = 1000
+        # Sweeps per point, at most if the equilibrium sweeps are auto.
+        total_sweeps = 10000
+        results = ResultStore("var_cut", attrs=params, mode=store_mode)
+        results.set_attrs(p3=p3, total_sweeps=total_sweeps)
+        results.save("p1", p1s)
+        results.create("variance", p1s.shape)
+        results.create("error", p1s.shape)
+        # One random stream per p1, as run_tasks gives the heatmap points.
+        seeds = np.random.SeedSequence(args.seed).spawn(p1s.size)
         # Simulation begins.
         for i in range(p1s.size):
             print(p1s[i])
-            # Data storage.
-            psis = []
-            # New simulation.
-            simulation = SIRS(size=lattice_size,
-                              ini=ini_cond, p1=p1s[i], p2=p2, p3=p3)
-            # Sweeping.
-            for sweep in range(10000):
-                for j in range(simulation.size[0]*simulation.size[1]):
-                        simulation.update_SIRS()
-                if sweep >= eqm_sweeps:
-                        psis.append(simulation.get_infected())
-            # Update arrays.
-            var_array[i] = simulation.get_infected_var(psis) / \
-                (simulation.size[0] * simulation.size[1])
-            error_array[i] = simulation.bootstrap(psis, 100)
+            # Point finished by an earlier run.
+            if store.done([i]):
+                var_array[i], error_array[i] = store.get([i])
+                results.write("variance", i, var_array[i])
+                results.write("error", i, error_array[i])
+                continue
+            with INSTRUMENT.point([i]):
+                # New simulation.
+                simulation = SIRS(size=lattice_size,
+                                  ini=ini_cond, p1=p1s[i], p2=p2, p3=p3,
+                                  seed=seeds[i], scheme=scheme)
+                simulation.record(total_sweeps)
+                start = 0
+                # Pick up an interrupted point where it stopped.
+                state = store.load_state([i], simulation.rng)
+                if state is not None:
+                    simulation.lattice = state["lattice"]
+                    start = int(state["sweep"])
+                    simulation.history[:start] = state["history"]
+                    simulation.n_recorded = start
+                # Per sweep infected counts, appended a chunk at a time.
+                series = "infected_%02d" % i
+                # Sweeping.
+                for sweep in range(start, total_sweeps):
+                    simulation.sweep()
+                    if (sweep + 1) % state_every == 0:
+                        chunk = sweep + 1 - state_every
+                        results.append(series, simulation.history[chunk:sweep + 1, 1],
+                                       start=chunk)
+                        store.save_state([i], simulation.rng, lattice=simulation.lattice,
+                                         history=simulation.get_history(), sweep=sweep + 1)
+                    # Stop once the variance is known well enough.
+                    if eqm_sweeps is None and (sweep + 1) % 100 == 0:
+                        if simulation.check_converged(var_error=args.var_error)[0]:
+                            break
+                # Update arrays.
+                var_array[i], error_array[i] = cut_variance(simulation, eqm_sweeps)
+                # Sweeps after the last full chunk, stored before the
+                # point is marked done so a rerun never loses them.
+                chunk = simulation.n_recorded - simulation.n_recorded % state_every
+                if chunk < simulation.n_recorded:
+                    results.append(series, simulation.get_history()[chunk:, 1], start=chunk)
+                store.save([i], [var_array[i], error_array[i]])
+                results.write("variance", i, var_array[i])
+                results.write("error", i, error_array[i])
+
+        simulation = SIRS(size=lattice_size, ini=ini_cond,
+                          p1=0.0, p2=p2, p3=p3)
 
         # Plotting.
         simulation.plot_figure(p1s, var_array, error_array)
 
-        # Writing to a file.
-        with open("var_cut.dat", "w+") as f:
-            f.writelines(map("{}, {}, {}\n".format, p1s, var_array, error_array))
             
     # Immunity plot.
     elif desired_plot == 'immunity':
@@ -126,49 +245,55 @@ def main():
         # Initialising x domain.
         im_fracs = np.arange(0.0, 0.525, 0.025)
         # Data storage.
-        overall_psis = []
+        overall_psis = np.zeros((5, im_fracs.size))
         im_errors = []
-        # Looping to generate errorbars.
+        results = ResultStore("immunity", attrs=params, mode=store_mode)
+        results.set_attrs(p1=p1, p3=p3, repeats=5)
+        results.save("immune_fraction", im_fracs)
+        # Mean infected fraction of every (repeat, fraction) run.
+        results.create("infected_runs", (5, im_fracs.size))
+        # One independent task per (repeat, fraction) run.
+        tasks = []
         for k in range(5):
-            print(k)
-            # Data storage.
-            psi_per_k = []
-            # New simulation.
-            for frac in im_fracs:
-                psi_per_frac = []
-                simulation = SIRS(size=lattice_size,
-                                  ini=ini_cond, p1=p1, p2=p2, p3=p3)
-                # Creating immune sites.
-                for i in range(int(simulation.size[0]*simulation.size[1]*frac)):
-                    indices = (np.random.randint(0, simulation.size[0]),
-                               np.random.randint(0, simulation.size[1]))
-                    simulation.lattice[indices] = 2
-                # Sweeping.
-                for sweep in range(sweeps * 10):
-                    for j in range(simulation.size[0]*simulation.size[1]):
-                            simulation.update_SIRS()
-                    if sweep >= eqm_sweeps:
-                            # Storing infected sites per frac.
-                            psi_per_frac.append(simulation.get_infected() / (simulation.size[0] * simulation.size[1]))
-                # Storing averages.            
-                psi_per_k.append(simulation.get_avg_obs(psi_per_frac))
-            # Storing data from each simulation.
-            overall_psis.append(psi_per_k)
+            for f in range(im_fracs.size):
+                tasks.append({"size": lattice_size, "ini": ini_cond, "p1": p1,
+                              "p2": p2, "p3": p3, "frac": float(im_fracs[f]),
+                              "eqm_sweeps": eqm_sweeps, "sweeps": sweeps * 10,
+                              "scheme": scheme, "mean_error": args.mean_error,
+                              "index": (k, f)})
+
+        # Runs finished by an earlier run.
+        skip = []
+        for n in range(len(tasks)):
+            k, f = tasks[n]["index"]
+            if store.done([k, f]):
+                overall_psis[k, f] = store.get([k, f])
+                results.write("infected_runs", (k, f), overall_psis[k, f])
+                skip.append(n)
+
+        # Simulation begins, results arrive in any order.
+        for n, psi in run_tasks(immunity_point, tasks, workers=args.workers,
+                                seed=args.seed, skip=skip):
+            k, f = tasks[n]["index"]
+            print(k, tasks[n]["frac"])
+            overall_psis[k, f] = psi
+            store.save([k, f], psi)
+            results.write("infected_runs", (k, f), psi)
         # Computing errors.
-        for vals in np.array(overall_psis).T:
+        for vals in overall_psis.T:
             im_errors.append(np.std(vals)/math.sqrt(len(vals)))
         # Generating y_data.
         infected_fracs = np.mean(overall_psis, axis = 0)
 
         # Plotting.
-        plt.title('Infected Sites vs. Immune Fraction')
-        plt.xlabel('Immune Fraction')
-        plt.ylabel('Infected Fraction')
-        plt.errorbar(im_fracs, infected_fracs, yerr = im_errors)
-        plt.savefig("immunity_plot.png")
-        plt.show()
-
-        # Writing to file.
-        with open("immunity.dat", "w+") as f:
-            f.writelines(map("{}, {}, {}\n".format, im_fracs, infected_fracs, im_errors))
-main()
+        import SIRS_plots
+        SIRS_plots.plot_immunity(im_fracs, infected_fracs, im_errors)
+
+        # Writing to the result store.
+        results.save("infected_fraction", infected_fracs)
+        results.save("error", im_errors)
+
+    if args.instrument is not None:
+        INSTRUMENT.write(args.instrument)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import math
+import numpy as np
+
+
+class RunningStats(object):
+    def __init__(self):
+        """
+            Streaming mean and variance of a series using
+            Welford's algorithm, so the series itself never
+            has to be kept in memory.
+
+            Attributes:
+            n = number of values seen.
+            mean = running mean.
+            m2 = running sum of squared deviations.
+        """
+        self.n = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, value):
+        """
+            Adds a single value.
+        """
+        self.n += 1
+        delta = value - self.mean
+        self.mean += delta / self.n
+        self.m2 += delta * (value - self.mean)
+
+    def update_batch(self, values):
+        """
+            Adds an array of values at once by merging their
+            mean and variance into the running ones.
+        """
+        values = np.asarray(values, dtype=float)
+        if values.size == 0:
+            return
+        n_b = values.size
+        mean_b = values.mean()
+        m2_b = np.sum((values - mean_b)**2)
+        n = self.n + n_b
+        delta = mean_b - self.mean
+        self.mean += delta * n_b / n
+        self.m2 += m2_b + delta**2 * self.n * n_b / n
+        self.n = n
+
+    def var(self):
+        """
+            Population variance (as np.var) of the values seen.
+        """
+        if self.n == 0:
+            return 0.0
+        return self.m2 / self.n
+
+
+def bootstrap_variances(data, samples, rng=None, chunk_size=None):
+    """
+        Variances of bootstrap resamples of data, drawing
+        a (samples x n) index matrix at once. With
+        chunk_size, at most chunk_size resamples are held
+        in memory at a time.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+    data = np.asarray(data, dtype=float)
+    if chunk_size is None:
+        chunk_size = samples
+    variances = np.empty(samples)
+    for start in range(0, samples, chunk_size):
+        stop = min(start + chunk_size, samples)
+        indices = rng.integers(0, data.size, size=(stop - start, data.size))
+        variances[start:stop] = np.var(data[indices], axis=1)
+    return variances
+
+
+def jackknife_variance_error(data, n_blocks=20):
+    """
+        Blocked jackknife error of the variance of an
+        autocorrelated series. The series is cut into
+        n_blocks contiguous blocks and the variance is
+        recomputed with each block left out in turn.
+    """
+    data = np.asarray(data, dtype=float)
+    n_blocks = min(n_blocks, data.size)
+    blocks = np.array_split(data, n_blocks)
+    sums = np.array([np.sum(b) for b in blocks])
+    sq_sums = np.array([np.sum(b**2) for b in blocks])
+    sizes = np.array([b.size for b in blocks])
+    # Variance of the series with block k removed.
+    n = data.size - sizes
+    means = (sums.sum() - sums) / n
+    variances = (sq_sums.sum() - sq_sums) / n - means**2
+    return math.sqrt((n_blocks - 1) / n_blocks *
+                     np.sum((variances - variances.mean())**2))
+
+
+def blocking_error(data, min_blocks=16):
+    """
+        Standard error of the mean of an autocorrelated
+        series by repeated pairwise blocking, taking the
+        largest estimate over the levels that still have
+        at least min_blocks blocks.
+    """
+    data = np.asarray(data, dtype=float)
+    if data.size < 2:
+        return 0.0
+    best = math.sqrt(np.var(data) / (data.size - 1))
+    while data.size // 2 >= min_blocks:
+        half = data.size // 2
+        data = 0.5 * (data[0:2 * half:2] + data[1:2 * half:2])
+        best = max(best, math.sqrt(np.var(data) / (data.size - 1)))
+    return best
+
+
+def mser(data, batch=5):
+    """
+        Equilibration point of a series by MSER-5: the
+        truncation of batch means (over the first half)
+        that minimises the squared standard error of the
+        mean of the rest. Returns the number of leading
+        values to discard.
+    """
+    data = np.asarray(data, dtype=float)
+    n_batches = data.size // batch
+    if n_batches < 2:
+        return 0
+    means = data[:n_batches * batch].reshape(n_batches, batch).mean(axis=1)
+    # Sums over the batches from each truncation to the end.
+    sums = np.cumsum(means[::-1])[::-1]
+    sq_sums = np.cumsum(means[::-1]**2)[::-1]
+    cuts = np.arange(n_batches // 2 + 1)
+    remaining = n_batches - cuts
+    sq_dev = sq_sums[cuts] - sums[cuts]**2 / remaining
+    return int(np.argmin(sq_dev / remaining**2)) * batch
@@ -0,0 +1,126 @@
+from SIRS import SIRS
+from SIRS_stats import blocking_error
+
+
+def heatmap_point(task, seed):
+    """
+        Simulates one (p1, p3) point of the phase diagram
+        and returns (<I>/N, Var(I)/N), both zero if the
+        absorbing state is reached.
+
+        task = dict with size, ini, p1, p2, p3,
+               eqm_sweeps, sweeps and optionally scheme.
+               eqm_sweeps = None detects equilibration and
+               stops once the errors are below the optional
+               mean_error and var_error, sweeps at most.
+    """
+    simulation = SIRS(size=task["size"], ini=task["ini"], p1=task["p1"],
+                      p2=task["p2"], p3=task["p3"], seed=seed,
+                      scheme=task.get("scheme", "sequential"))
+    n_sites = simulation.size[0] * simulation.size[1]
+    eqm_sweeps = task["eqm_sweeps"]
+    if eqm_sweeps is None:
+        eqm_sweeps = simulation.sweep_until_converged(
+            task["sweeps"], mean_error=task.get("mean_error"),
+            var_error=task.get("var_error"))
+    else:
+        simulation.record(task["sweeps"])
+        # Sweep over lattice.
+        for sweep in range(task["sweeps"]):
+            simulation.sweep()
+            # Stop when absorbing state reached.
+            if sweep >= eqm_sweeps and simulation.get_infected() == 0:
+                break
+    # Get data, the absorbing state is not counted.
+    psis = simulation.get_history()[eqm_sweeps:, 1]
+    psis = psis[psis != 0]
+    # Data collection.
+    if len(psis) != 0:
+        return (simulation.get_avg_obs(psis) / n_sites,
+                simulation.get_infected_var(psis) / n_sites)
+    return (0.0, 0.0)
+
+
+def cut_point(task, seed):
+    """
+        Simulates one point of a p1 cut and returns the
+        infected fraction mean and variance per site with
+        their errors, (mean, mean error, var, var error).
+        Errors are from blocking and a blocked jackknife,
+        as the sweeps are autocorrelated.
+
+        task = dict with size, ini, p1, p2, p3, scheme,
+               eqm_sweeps and sweeps.
+    """
+    simulation = SIRS(size=task["size"], ini=task["ini"], p1=task["p1"],
+                      p2=task["p2"], p3=task["p3"], seed=seed,
+                      scheme=task["scheme"])
+    n_sites = simulation.size[0] * simulation.size[1]
+    simulation.record(task["sweeps"])
+    simulation.sweep(task["sweeps"])
+    psis = simulation.get_history()[task["eqm_sweeps"]:, 1]
+    return (simulation.get_avg_obs(psis) / n_sites,
+            blocking_error(psis) / n_sites,
+            simulation.get_infected_var(psis) / n_sites,
+            simulation.jackknife(psis))
+
+
+def cut_variance(simulation, eqm_sweeps):
+    """
+        Var(I)/N of a finished variance cut run and its
+        bootstrap error, as SIRS_plotter's variance_plot.
+        eqm_sweeps = None detects the equilibration.
+    """
+    if eqm_sweeps is None:
+        eqm_sweeps = simulation.equilibration()
+    psis = simulation.get_history()[eqm_sweeps:, 1]
+    return (simulation.get_infected_var(psis) / (simulation.size[0] * simulation.size[1]),
+            simulation.bootstrap(psis, 100))
+
+
+def variance_point(task, seed):
+    """
+        Simulates one p1 of SIRS_plotter's variance_plot
+        and returns (Var(I)/N, bootstrap error).
+
+        task = dict with size, ini, p1, p2, p3, scheme,
+               eqm_sweeps, sweeps and optionally var_error.
+               eqm_sweeps = None checks every 100 sweeps
+               and stops once the Var(I)/N error is below
+               var_error, sweeps at most.
+    """
+    simulation = SIRS(size=task["size"], ini=task["ini"], p1=task["p1"],
+                      p2=task["p2"], p3=task["p3"], seed=seed,
+                      scheme=task["scheme"])
+    simulation.record(task["sweeps"])
+    for sweep in range(task["sweeps"]):
+        simulation.sweep()
+        # Stop once the variance is known well enough.
+        if task["eqm_sweeps"] is None and (sweep + 1) % 100 == 0:
+            if simulation.check_converged(var_error=task.get("var_error"))[0]:
+                break
+    return cut_variance(simulation, task["eqm_sweeps"])
+
+
+def immunity_point(task, seed):
+    """
+        Simulates one run of the immunity plot and returns
+        <I>/N with a fraction of the sites immune.
+
+        task = dict with size, ini, p1, p2, p3, frac,
+               eqm_sweeps, sweeps and optionally scheme,
+               mean_error (see heatmap_point).
+    """
+    simulation = SIRS(size=task["size"], ini=task["ini"], p1=task["p1"],
+                      p2=task["p2"], p3=task["p3"], seed=seed,
+                      scheme=task.get("scheme", "sequential"))
+    simulation.seed_immune(task["frac"])
+    eqm_sweeps = task["eqm_sweeps"]
+    if eqm_sweeps is None:
+        eqm_sweeps = simulation.sweep_until_converged(
+            task["sweeps"], mean_error=task.get("mean_error"))
+    else:
+        simulation.record(task["sweeps"])
+        simulation.sweep(task["sweeps"])
+    psis = simulation.get_history()[eqm_sweeps:, 1]
+    return simulation.get_avg_obs(psis) / (simulation.size[0] * simulation.size[1])
@@ -0,0 +1,95 @@
+from SIRS_sweeps import cut_point
+from sweeper import run_tasks
+import numpy as np
+import argparse
+
+
+def compare_schemes(size=(50, 50), p1s=np.arange(0.2, 0.51, 0.01), p2=0.5, p3=0.5,
+                    eqm_sweeps=100, sweeps=10000, schemes=("sequential", "checkerboard"),
+                    workers=None, seed=None):
+    """
+        Runs the p3 = 0.5 cut of variance_plot with every
+        update scheme and returns {scheme: (n_points, 4)
+        array} of infected fraction mean, mean error,
+        variance and variance error per p1.
+    """
+    tasks = []
+    for scheme in schemes:
+        for p1 in p1s:
+            tasks.append({"size": size, "ini": "random", "p1": float(p1), "p2": p2,
+                          "p3": p3, "scheme": scheme, "eqm_sweeps": eqm_sweeps,
+                          "sweeps": sweeps})
+    curves = {scheme: np.zeros((p1s.size, 4)) for scheme in schemes}
+    for k, result in run_tasks(cut_point, tasks, workers=workers, seed=seed):
+        curves[tasks[k]["scheme"]][k % p1s.size] = result
+    return curves
+
+
+def max_deviation(reference, other):
+    """
+        Largest difference of the mean and of the variance
+        curves in units of their combined error.
+    """
+    deviations = []
+    for value, error in ((0, 1), (2, 3)):
+        combined = np.sqrt(reference[:, error]**2 + other[:, error]**2)
+        difference = np.abs(reference[:, value] - other[:, value])
+        deviations.append(np.max(difference / np.maximum(combined, 1e-12)))
+    return tuple(deviations)
+
+
+def plot_curves(p1s, curves):
+    """
+        Plots the mean and variance curves of every scheme.
+    """
+    # Imported here so the workers never load matplotlib.
+    import matplotlib.pyplot as plt
+    fig, (ax_mean, ax_var) = plt.subplots(1, 2, figsize=(10, 4))
+    for scheme in curves:
+        ax_mean.errorbar(p1s, curves[scheme][:, 0], yerr=curves[scheme][:, 1],
+                         label=scheme, capsize=2)
+        ax_var.errorbar(p1s, curves[scheme][:, 2], yerr=curves[scheme][:, 3],
+                        label=scheme, capsize=2)
+    ax_mean.set_xlabel("P1")
+    ax_mean.set_ylabel("<I>/N")
+    ax_var.set_xlabel("P1")
+    ax_var.set_ylabel("Var(I)/N")
+    ax_var.legend()
+    plt.tight_layout()
+    plt.show()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Compare SIRS update schemes along the p3 = 0.5 cut.")
+    parser.add_argument("--size", type=int, default=50, help="lattice side")
+    parser.add_argument("--sweeps", type=int, default=10000)
+    parser.add_argument("--eqm-sweeps", type=int, default=100)
+    parser.add_argument("--scheme", default="checkerboard",
+                        help="scheme compared with random sequential")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--plot", action="store_true")
+    args = parser.parse_args()
+
+    p1s = np.arange(0.2, 0.51, 0.01)
+    curves = compare_schemes(size=(args.size, args.size), p1s=p1s,
+                             eqm_sweeps=args.eqm_sweeps, sweeps=args.sweeps,
+                             schemes=("sequential", args.scheme),
+                             workers=args.workers, seed=args.seed)
+    reference = curves["sequential"]
+    other = curves[args.scheme]
+    print("p1, mean (sequential), mean (" + args.scheme + "), "
+          "var (sequential), var (" + args.scheme + ")")
+    for i in range(p1s.size):
+        print("{:.2f}, {:.4f}, {:.4f}, {:.4f}, {:.4f}".format(
+            p1s[i], reference[i, 0], other[i, 0], reference[i, 2], other[i, 2]))
+    mean_dev, var_dev = max_deviation(reference, other)
+    print("Largest deviation: mean {:.2f} sigma, variance {:.2f} sigma".format(
+        mean_dev, var_dev))
+    if args.plot:
+        plot_curves(p1s, curves)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import importlib
+import os
+import numpy as np
+from topology import get_topology
+
+# Registered backends per model, name -> class.
+BACKENDS = {"gol": {}, "sirs": {}}
+# Module registering the backends of each model, imported on first
+# use so SIRS never loads the GOL backends (and the reverse).
+MODULES = {"gol": "GOL_backends", "sirs": "SIRS_backends"}
+# Backend used when none is asked for, fastest installed first.
+PREFERENCE = {"gol": ("numba", "numpy", "python"),
+              "sirs": ("numba", "python", "numpy")}
+# Lattices of at least this many sites prefer numpy to python. The numpy
+# SIRS runs are about sqrt(N) long, so it only wins on large lattices.
+NUMPY_MIN_SITES = {"sirs": 400 * 400}
+# Environment variables that override the default backend.
+ENVIRONMENT = {"gol": "GOL_BACKEND", "sirs": "SIRS_BACKEND"}
+
+
+def register(model, name):
+    """
+        Class decorator adding a backend to the registry.
+    """
+    def decorator(backend):
+        backend.name = name
+        BACKENDS[model][name] = backend
+        return backend
+    return decorator
+
+
+def load(model):
+    """
+        Imports the backends of a model, once.
+    """
+    importlib.import_module(MODULES[model])
+
+
+def available(model):
+    """
+        Names of the backends of a model that can run here.
+    """
+    load(model)
+    return [name for name in BACKENDS[model] if BACKENDS[model][name].available]
+
+
+def get_backend(model, name=None, size=None):
+    """
+        Backend class of a model chosen by name, else by the
+        GOL_BACKEND / SIRS_BACKEND environment variable, else
+        the fastest one installed for a lattice of the given
+        size.
+    """
+    load(model)
+    if name is None:
+        name = os.environ.get(ENVIRONMENT[model])
+    if name is None:
+        preference = PREFERENCE[model]
+        if size is not None and model in NUMPY_MIN_SITES and \
+                size[0] * size[1] >= NUMPY_MIN_SITES[model]:
+            preference = [name for name in preference if name != "python"] + ["python"]
+        for name in preference:
+            if BACKENDS[model][name].available:
+                break
+    if name not in BACKENDS[model]:
+        raise ValueError("Unknown " + model.upper() + " backend: " + str(name))
+    if not BACKENDS[model][name].available:
+        raise ValueError(model.upper() + " backend " + name + " is not installed.")
+    return BACKENDS[model][name]
+
+
+def check_sirs(start, neighbours, steps, rng, topology):
+    """
+        Checks that every SIRS backend gives the lattice and
+        counts of the python one, for each scheme, starting
+        from the same lattice on the given neighbour table.
+        Returns the python (lattice, counts) per scheme.
+    """
+    import SIRS_kernels
+    n_sites = start.size
+    sites = rng.integers(0, n_sites, size=steps * n_sites)
+    rands = rng.random(sites.size)
+    kmc_rands = rng.random(3 * steps * n_sites)
+    # Checkerboard updates need a bipartite table.
+    schemes = ("sequential", "checkerboard", "kmc") if topology.startswith("von") \
+        else ("sequential", "kmc")
+    python = {}
+    for scheme in schemes:
+        results = {}
+        for name in available("sirs"):
+            backend = get_backend("sirs", name)
+            lattice = start.copy()
+            counts = np.bincount(lattice.reshape(-1) + 1, minlength=4).astype(np.int64)
+            if scheme == "sequential":
+                backend.sequential(lattice, counts, neighbours, sites, rands, 0.6, 0.3, 0.2)
+            elif scheme == "checkerboard":
+                for step in range(steps):
+                    block = rands[step * n_sites:(step + 1) * n_sites]
+                    backend.checkerboard(lattice, counts, neighbours,
+                                         block.reshape(lattice.shape), step % 2, 0.5,
+                                         0.6, 0.3, 0.2)
+            else:
+                classes = SIRS_kernels.kmc_classes(lattice, neighbours)
+                index = 0
+                for step in range(steps):
+                    rands_left, index, time, events = backend.kmc(
+                        lattice, counts, neighbours, classes, n_sites, 0.6, 0.3, 0.2,
+                        kmc_rands, index, n_sites)
+            results[name] = (lattice, counts)
+        for name in results:
+            assert np.array_equal(results[name][0], results["python"][0]) and \
+                np.array_equal(results[name][1], results["python"][1]), \
+                "SIRS " + scheme + " backend " + name + " differs from python on " + \
+                topology
+        python[scheme] = results["python"]
+    return python
+
+
+def check_equivalence(size=(37, 29), steps=20, seed=7):
+    """
+        Cross backend equivalence test: every installed backend
+        must give identical lattices (and SIRS state counts)
+        from the same seed and starting lattice. Raises
+        AssertionError on the first mismatch.
+    """
+    import GOL_kernels
+    rng = np.random.default_rng(seed)
+    start = rng.choice(a=[0, 1], size=size)
+    results = {}
+    for name in available("gol"):
+        backend = get_backend("gol", name)(size)
+        state = backend.from_lattice(start.copy())
+        for step in range(steps):
+            state = backend.step(state)
+        results[name] = np.asarray(backend.to_lattice(state), dtype=np.int64)
+    for name in results:
+        assert np.array_equal(results[name], results["python"]), \
+            "GOL backend " + name + " differs from python"
+
+    # Open edges and other neighbourhoods, cropped to even sides for hexagonal.
+    even = (size[0] // 2 * 2, size[1] // 2 * 2)
+    for neighbourhood, boundary in (("moore", "open"), ("hexagonal", "periodic")):
+        topology = get_topology(even, neighbourhood, boundary)
+        flat = start[:even[0], :even[1]].reshape(-1).astype(np.int8)
+        results = {}
+        for name, step in (("python", GOL_kernels.table_step),
+                           ("numpy", GOL_kernels.numpy_table_step),
+                           ("numba", GOL_kernels.compiled_table_step)):
+            if step is None:
+                continue
+            lattice = flat.copy()
+            out = np.empty_like(lattice)
+            for k in range(steps):
+                step(lattice, out, topology.neighbours, topology.missing)
+                lattice, out = out, lattice
+            results[name] = lattice
+        for name in results:
+            assert np.array_equal(results[name], results["python"]), \
+                "GOL " + neighbourhood + " " + boundary + " kernel " + name + \
+                " differs from python"
+
+    start = rng.choice(a=np.array([-1, 0, 1], dtype=np.int8), size=size)
+    lattice_start = start[:even[0], :even[1]]
+    for neighbourhood, boundary in (("moore", "open"), ("hexagonal", "periodic"),
+                                    ("von_neumann", "open")):
+        neighbours = get_topology(even, neighbourhood, boundary).neighbours
+        check_sirs(lattice_start.copy(), neighbours, steps, rng,
+                   neighbourhood + " " + boundary)
+    # Periodic von Neumann kernels wrap indices, they must match the table.
+    state = rng.bit_generator.state
+    wrapped = check_sirs(lattice_start.copy(), None, steps, rng, "von_neumann periodic")
+    rng.bit_generator.state = state
+    table = check_sirs(lattice_start.copy(),
+                       get_topology(even, "von_neumann", "periodic").neighbours,
+                       steps, rng, "von_neumann periodic table")
+    for scheme in wrapped:
+        assert np.array_equal(wrapped[scheme][0], table[scheme][0]), \
+            "SIRS " + scheme + " differs between wrapped indices and the table"
+
+    print("GOL backends: " + ", ".join(available("gol")))
+    print("SIRS backends: " + ", ".join(available("sirs")))
+    print("All backends agree.")
+
+
+if __name__ == "__main__":
+    # Backends register into the imported module, not __main__.
+    import backends
+    backends.check_equivalence()
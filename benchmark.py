@@ -0,0 +1,192 @@
+from SIRS import SIRS
+from GOL import GOL
+from GOL_ensemble import GOLEnsemble
+from SIRS_sweeps import heatmap_point, immunity_point
+import backends
+import SIRS_kernels
+import numpy as np
+import argparse
+import itertools
+import json
+import platform
+import time
+import tracemalloc
+
+# Largest lattice side the interpreted (per site) paths are timed at.
+PYTHON_MAX_SIZE = 256
+# Largest lattice side the full plotter workloads are timed at.
+WORKLOAD_MAX_SIZE = 256
+
+
+def measure(func, repeats=3):
+    """
+        Best time of repeats calls of func, after one
+        warm-up call (which also compiles Numba kernels),
+        and the peak memory allocated by one more call,
+        traced separately so tracing does not slow the
+        timed calls. Returns (seconds, peak MB).
+    """
+    func()
+    best = float("inf")
+    for repeat in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak / 2**20
+
+
+def sirs_cases(n):
+    """
+        Yields (name, function, sites per call) of the SIRS
+        hot paths for an n x n lattice, one lattice at a time.
+    """
+    if n <= PYTHON_MAX_SIZE:
+        simulation = SIRS(size=(n, n), ini="random", p1=0.5, p2=0.5, p3=0.5, seed=0)
+
+        def reference_sweep():
+            for update in range(n * n):
+                simulation.update_SIRS()
+        yield "sirs/update_SIRS/" + str(n), reference_sweep, n * n
+    for name in backends.available("sirs"):
+        if name == "python" and n > PYTHON_MAX_SIZE:
+            continue
+        for scheme in SIRS.schemes:
+            # The numpy backend runs kmc on the interpreted kernel.
+            if scheme == "kmc" and n > PYTHON_MAX_SIZE and \
+                    backends.get_backend("sirs", name).kmc is SIRS_kernels.kmc_python:
+                continue
+            simulation = SIRS(size=(n, n), ini="random", p1=0.5, p2=0.5, p3=0.5,
+                              seed=0, scheme=scheme, backend=name)
+            yield "sirs/sweep/" + scheme + "/" + name + "/" + str(n), simulation.sweep, n * n
+    simulation = SIRS(size=(n, n), ini="random", p1=0.5, p2=0.5, p3=0.5, seed=0)
+
+    def get_infected():
+        for call in range(1000):
+            simulation.get_infected()
+    yield "sirs/get_infected_x1000/" + str(n), get_infected, n * n
+
+
+def gol_cases(n):
+    """
+        Yields (name, function, sites per call) of GOL
+        generations with every installed backend for an
+        n x n lattice.
+    """
+    for name in backends.available("gol"):
+        if name == "python" and n > PYTHON_MAX_SIZE:
+            continue
+        np.random.seed(0)
+        game = GOL(size=(n, n), ini="random", engine=name)
+        yield "gol/evolve_state/" + name + "/" + str(n), game.evolve_state, n * n
+        if hasattr(game.backend, "close"):
+            game.backend.close()
+
+
+def stats_cases():
+    """
+        (name, function, values per call) of the error
+        estimates on a 10000 sweep series.
+    """
+    simulation = SIRS(size=(50, 50), ini="random", p1=0.5, p2=0.5, p3=0.5, seed=0)
+    psis = np.random.default_rng(0).integers(0, 2500, size=10000)
+    return [("stats/bootstrap_100/10000", lambda: simulation.bootstrap(psis, 100), 10000),
+            ("stats/jackknife/10000", lambda: simulation.jackknife(psis), 10000)]
+
+
+def workload_cases(n, sweeps=100):
+    """
+        (name, function, site updates per call) of short
+        runs of the plotter workloads on an n x n lattice.
+    """
+    task = {"size": (n, n), "ini": "random", "p1": 0.5, "p2": 0.5, "p3": 0.5,
+            "eqm_sweeps": 10, "sweeps": sweeps, "frac": 0.25}
+    ensemble = {"size": (n, n), "replicas": 8, "max_sweeps": sweeps}
+    # Replicas retire early, so count the cells actually stepped.
+    counted = GOLEnsemble(**ensemble, seed=0)
+    counted.run()
+    # Immune sites are never visited, a sweep updates the others.
+    mobile = n * n - int(round(task["frac"] * n * n))
+    return [("workload/heatmap_point/" + str(n),
+             lambda: heatmap_point(task, 0), n * n * sweeps),
+            ("workload/immunity_point/" + str(n),
+             lambda: immunity_point(task, 0), mobile * sweeps),
+            ("workload/gol_ensemble/" + str(n),
+             lambda: GOLEnsemble(**ensemble, seed=0).run(),
+             counted.cell_updates)]
+
+
+def run_suite(sizes=(50, 256, 1024, 4096), repeats=3, only=None):
+    """
+        Times every case and returns {name: {"seconds",
+        "sites_per_second", "peak_mb"}}. Names containing
+        none of the strings in only are skipped.
+    """
+    cases = [stats_cases()]
+    for n in sizes:
+        cases += [sirs_cases(n), gol_cases(n)]
+        if n <= WORKLOAD_MAX_SIZE:
+            cases.append(workload_cases(n))
+    results = {}
+    for name, func, sites in itertools.chain(*cases):
+        if only is not None and not any(part in name for part in only):
+            continue
+        seconds, peak = measure(func, repeats)
+        results[name] = {"seconds": seconds, "sites_per_second": sites / seconds,
+                         "peak_mb": peak}
+        print("{:45s} {:.3e} s {:.3e} sites/s {:8.1f} MB".format(
+            name, seconds, sites / seconds, peak))
+    return results
+
+
+def compare(results, baseline, tolerance=1.25):
+    """
+        Names of the cases more than tolerance times slower
+        than in the baseline, with their slowdown.
+    """
+    slower = {}
+    for name in results:
+        if name in baseline:
+            ratio = results[name]["seconds"] / baseline[name]["seconds"]
+            if ratio > tolerance:
+                slower[name] = ratio
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SIRS and GOL benchmark suite.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 256, 1024, 4096],
+                        help="lattice sides to time")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--only", nargs="+", default=None,
+                        help="only run cases whose name contains one of these")
+    parser.add_argument("--output", default="benchmark.json",
+                        help="JSON file the results are written to")
+    parser.add_argument("--baseline", default=None,
+                        help="JSON results to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.25,
+                        help="slowdown over the baseline that fails the run")
+    args = parser.parse_args()
+
+    results = run_suite(args.sizes, args.repeats, args.only)
+    with open(args.output, "w") as f:
+        json.dump({"machine": platform.platform(), "python": platform.python_version(),
+                   "numpy": np.__version__, "results": results}, f, indent=1)
+
+    if args.baseline is not None:
+        with open(args.baseline, "r") as f:
+            baseline = json.load(f)["results"]
+        slower = compare(results, baseline, args.tolerance)
+        for name in sorted(slower):
+            print("SLOWER: {} is {:.2f}x the baseline time".format(name, slower[name]))
+        if len(slower) > 0:
+            raise SystemExit(str(len(slower)) + " benchmark(s) regressed by more than " +
+                             str(args.tolerance) + "x.")
+        print("No regressions against " + args.baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import json
+import os
+import numpy as np
+from instrument import INSTRUMENT
+
+
+class Checkpoint(object):
+    def __init__(self, path, params, resume=False):
+        """
+            Append-only checkpoint store for parameter sweeps.
+
+            Attributes:
+            path = path (str), file holding one JSON line per
+                   finished grid point, live states are kept in
+                   the directory path + ".states".
+            params = params (dict), parameters of the sweep, a
+                     resumed sweep must use the same ones.
+            resume = resume (bool), keep the points already in
+                     path instead of starting afresh.
+        """
+        self.path = path
+        self.state_dir = path + ".states"
+        self.params = params
+        self.results = {}
+
+        if resume and os.path.exists(path):
+            self.load()
+        else:
+            with open(path, "w") as f:
+                f.write(json.dumps({"params": params}) + "\n")
+            for name in self.list_states():
+                os.remove(os.path.join(self.state_dir, name))
+
+    def load(self):
+        """
+            Reads the finished points of a previous run,
+            ignoring a partly written last line.
+        """
+        with open(self.path, "r") as f:
+            lines = f.read().split("\n")
+        header = json.loads(lines[0])
+        if header["params"] != json.loads(json.dumps(self.params)):
+            raise ValueError("Checkpoint " + self.path +
+                             " was written with different parameters.")
+        for line in lines[1:]:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            self.results[self.to_key(entry["key"])] = entry["result"]
+        # Start new entries on a fresh line after a partial write.
+        if lines[-1] != "":
+            with open(self.path, "a") as f:
+                f.write("\n")
+
+    def to_key(self, key):
+        """
+            Hashable form of a JSON grid point key.
+        """
+        return json.dumps(key)
+
+    def done(self, key):
+        """
+            True if the grid point has been saved.
+        """
+        return self.to_key(key) in self.results
+
+    def get(self, key):
+        """
+            Result saved for a grid point.
+        """
+        return self.results[self.to_key(key)]
+
+    def save(self, key, result):
+        """
+            Saves the result of a finished grid point and
+            forces it to disk before returning.
+        """
+        self.results[self.to_key(key)] = result
+        with INSTRUMENT.timer("io"), open(self.path, "a") as f:
+            f.write(json.dumps({"key": key, "result": result}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.clear_state(key)
+
+    def state_path(self, key):
+        """
+            File holding the live state of a grid point.
+        """
+        name = "_".join(str(k) for k in np.atleast_1d(key))
+        return os.path.join(self.state_dir, "state_" + name + ".npz")
+
+    def list_states(self):
+        """
+            Names of the saved live states.
+        """
+        if not os.path.isdir(self.state_dir):
+            return []
+        return os.listdir(self.state_dir)
+
+    def save_state(self, key, rng, **arrays):
+        """
+            Saves the live state of an unfinished grid point,
+            the generator state of rng plus any arrays such as
+            the lattice, atomically replacing the old one.
+        """
+        os.makedirs(self.state_dir, exist_ok=True)
+        path = self.state_path(key)
+        tmp = path + ".tmp.npz"
+        with INSTRUMENT.timer("io"):
+            np.savez(tmp, rng_state=json.dumps(rng.bit_generator.state), **arrays)
+            os.replace(tmp, path)
+
+    def load_state(self, key, rng):
+        """
+            Restores rng to the saved generator state of an
+            unfinished grid point and returns its arrays, or
+            None if no state was saved.
+        """
+        path = self.state_path(key)
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as data:
+            arrays = {name: data[name] for name in data.files}
+        rng.bit_generator.state = json.loads(str(arrays.pop("rng_state")))
+        return arrays
+
+    def clear_state(self, key):
+        """
+            Removes the live state of a finished grid point.
+        """
+        path = self.state_path(key)
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,221 @@
+import cProfile
+import json
+import os
+import time
+
+
+class Timer(object):
+    def __init__(self, instrument, name):
+        """
+            Context manager adding the time spent in its
+            block to one of the instrument's timers.
+
+            Attributes:
+            instrument = instrument (Instrument), owner.
+            name = name (str), timer the time is added to.
+        """
+        self.instrument = instrument
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrument.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullTimer(object):
+    """
+        Timer used while instrumentation is off, does nothing.
+    """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Instrument(object):
+    def __init__(self):
+        """
+            Low overhead counters and phase timers of a run,
+            off until enable is called.
+
+            Attributes:
+            enabled = whether counts and times are recorded.
+            profile_dir = directory cProfile stats of every
+                          grid point are written to, or None.
+            counters = counts per name (site updates,
+                       transitions, sweeps, generations...).
+            timers = [seconds, calls] per phase name.
+            points = wall time, counters and timers of every
+                     grid point.
+        """
+        self.enabled = False
+        self.profile_dir = None
+        self.reset()
+
+    def reset(self):
+        """
+            Clears every count, time and point.
+        """
+        self.counters = {}
+        self.timers = {}
+        self.points = []
+        self.start = time.perf_counter()
+
+    def enable(self, profile_dir=None):
+        """
+            Starts recording, with cProfile stats of every
+            grid point written to profile_dir if given.
+        """
+        self.enabled = True
+        self.profile_dir = profile_dir
+        if profile_dir is not None:
+            os.makedirs(profile_dir, exist_ok=True)
+        self.reset()
+
+    def count(self, name, n=1):
+        """
+            Adds n to a counter.
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def timer(self, name):
+        """
+            Context manager timing a phase.
+        """
+        if self.enabled:
+            return Timer(self, name)
+        return NULL_TIMER
+
+    def add_time(self, name, seconds, calls=1):
+        """
+            Adds seconds (over calls calls) to a phase timer.
+        """
+        entry = self.timers.setdefault(name, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += calls
+
+    def snapshot(self):
+        """
+            Copy of the counters and timers.
+        """
+        return {"counters": dict(self.counters),
+                "timers": {name: list(entry) for name, entry in self.timers.items()}}
+
+    def merge(self, snapshot):
+        """
+            Adds the counters and timers of a snapshot, from a
+            worker process for example.
+        """
+        for name, n in snapshot["counters"].items():
+            self.counters[name] = self.counters.get(name, 0) + n
+        for name, (seconds, calls) in snapshot["timers"].items():
+            self.add_time(name, seconds, calls)
+
+    def difference(self, before):
+        """
+            Counters and timers accumulated since snapshot
+            before was taken.
+        """
+        now = self.snapshot()
+        for name, n in before["counters"].items():
+            now["counters"][name] -= n
+        for name, (seconds, calls) in before["timers"].items():
+            now["timers"][name][0] -= seconds
+            now["timers"][name][1] -= calls
+        return now
+
+    def add_point(self, key, seconds, snapshot):
+        """
+            Records the wall time and the counters and timers
+            of one grid point, with its site update rate.
+        """
+        point = {"key": key, "seconds": seconds}
+        point.update(snapshot)
+        updates = snapshot["counters"].get("site_updates", 0) + \
+            snapshot["counters"].get("cell_updates", 0)
+        if seconds > 0:
+            point["updates_per_second"] = updates / seconds
+        self.points.append(point)
+
+    def point(self, key):
+        """
+            Context manager recording the block as one grid
+            point run in this process.
+        """
+        if self.enabled:
+            return PointTimer(self, key)
+        return NULL_TIMER
+
+    def summary(self):
+        """
+            Totals of the run as a JSON serialisable dict.
+        """
+        return {"wall_seconds": time.perf_counter() - self.start,
+                "counters": self.counters,
+                "timers": {name: {"seconds": seconds, "calls": calls}
+                           for name, (seconds, calls) in self.timers.items()},
+                "points": self.points}
+
+    def write(self, path):
+        """
+            Writes the summary to a JSON file.
+        """
+        with open(path, "w") as f:
+            json.dump(self.summary(), f, indent=1, default=str)
+
+
+class PointTimer(object):
+    def __init__(self, instrument, key):
+        """
+            Context manager recording a grid point, profiled
+            with cProfile when the instrument has a profile_dir.
+
+            Attributes:
+            instrument = instrument (Instrument), owner.
+            key = key (list), grid point the block runs.
+        """
+        self.instrument = instrument
+        self.key = key
+        self.profile = None
+
+    def __enter__(self):
+        self.before = self.instrument.snapshot()
+        if self.instrument.profile_dir is not None:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        if self.profile is not None:
+            self.profile.disable()
+            name = "point_" + "_".join(str(k) for k in self.key) + ".prof"
+            self.profile.dump_stats(os.path.join(self.instrument.profile_dir, name))
+        self.instrument.add_point(self.key, seconds, self.instrument.difference(self.before))
+        return False
+
+
+# Instrument of this process, shared by the simulations and drivers.
+INSTRUMENT = Instrument()
+
+
+def instrumented_call(func, task, seed, key, profile_dir):
+    """
+        Runs func(task, seed) in a worker process with the
+        worker's instrument on, and returns the result with
+        the counters and timers of the call, for run_tasks.
+    """
+    INSTRUMENT.enable(profile_dir)
+    with INSTRUMENT.point(key):
+        result = func(task, seed)
+    return result, INSTRUMENT.points[-1]
@@ -0,0 +1,150 @@
+import os
+import queue
+import shutil
+import subprocess
+import threading
+import numpy as np
+
+# RGB colour of each lattice state, close to the jet colour map
+# used by run_animation.
+SIRS_COLOURS = {-1: (0, 0, 128), 0: (124, 255, 121), 1: (128, 0, 0),
+                2: (255, 255, 255)}
+GOL_COLOURS = {0: (0, 0, 128), 1: (128, 0, 0)}
+
+# Extensions that are encoded by ffmpeg rather than written as frames.
+VIDEO_EXTENSIONS = (".mp4", ".mkv", ".avi", ".mov", ".webm", ".gif")
+
+
+class ColourTable(object):
+    def __init__(self, colours):
+        """
+            Precomputed lookup table from integer lattice
+            states to RGB colours.
+
+            Attributes:
+            colours = colours (dict), RGB tuple per state.
+        """
+        self.offset = -min(colours)
+        self.table = np.zeros((max(colours) + self.offset + 1, 3), dtype=np.uint8)
+        for state, colour in colours.items():
+            self.table[state + self.offset] = colour
+
+    def rgb(self, lattice, scale=1):
+        """
+            (H * scale, W * scale, 3) uint8 image of a lattice.
+        """
+        image = self.table[np.asarray(lattice).astype(np.intp) + self.offset]
+        if scale > 1:
+            image = np.repeat(np.repeat(image, scale, axis=0), scale, axis=1)
+        return image
+
+
+class FrameWriter(object):
+    def __init__(self, path, fps=25, max_queued=64):
+        """
+            Writes RGB frames from a background thread, either
+            piped to ffmpeg (path with a video extension) or as
+            numbered binary PPM files in the directory path.
+
+            Attributes:
+            path = path (str), output video file or directory.
+            fps = fps (int), frame rate of the video.
+            max_queued = max_queued (int), frames buffered before
+                         the simulation waits for the writer.
+        """
+        self.path = path
+        self.fps = fps
+        self.frames = queue.Queue(maxsize=max_queued)
+        self.error = None
+        self.count = 0
+        self.encoder = None
+        self.video = path.lower().endswith(VIDEO_EXTENSIONS)
+        if self.video and shutil.which("ffmpeg") is None:
+            raise RuntimeError("ffmpeg is needed to write " + path +
+                               ", give a directory to write frames instead.")
+        if not self.video:
+            os.makedirs(path, exist_ok=True)
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def start_encoder(self, shape):
+        """
+            Starts an ffmpeg process reading raw RGB frames of
+            the given (H, W, 3) shape from its stdin.
+        """
+        command = ["ffmpeg", "-y", "-loglevel", "error",
+                   "-f", "rawvideo", "-pix_fmt", "rgb24",
+                   "-s", "%dx%d" % (shape[1], shape[0]),
+                   "-r", str(self.fps), "-i", "-"]
+        if not self.path.lower().endswith(".gif"):
+            # Even dimensions are required by yuv420p.
+            command += ["-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2",
+                        "-pix_fmt", "yuv420p"]
+        self.encoder = subprocess.Popen(command + [self.path],
+                                        stdin=subprocess.PIPE)
+
+    def run(self):
+        """
+            Writer thread, drains the frame queue until it
+            receives None.
+        """
+        while True:
+            frame = self.frames.get()
+            if frame is None:
+                break
+            if self.error is not None:
+                continue
+            try:
+                if self.video:
+                    if self.encoder is None:
+                        self.start_encoder(frame.shape)
+                    self.encoder.stdin.write(frame.tobytes())
+                else:
+                    name = os.path.join(self.path, "frame_%06d.ppm" % self.count)
+                    with open(name, "wb") as f:
+                        f.write(b"P6 %d %d 255\n" % (frame.shape[1], frame.shape[0]))
+                        f.write(frame.tobytes())
+                self.count += 1
+            except Exception as error:
+                self.error = error
+
+    def write(self, frame):
+        """
+            Queues one RGB frame, blocking while the queue
+            is full.
+        """
+        if self.error is not None:
+            raise self.error
+        self.frames.put(np.ascontiguousarray(frame))
+
+    def close(self):
+        """
+            Flushes the queued frames and finishes the video.
+        """
+        self.frames.put(None)
+        self.thread.join()
+        if self.encoder is not None:
+            self.encoder.stdin.close()
+            self.encoder.wait()
+        if self.error is not None:
+            raise self.error
+
+
+def export(step, get_lattice, colours, path, frames, every=1, scale=1, fps=25):
+    """
+        Runs a simulation headless and streams its frames to
+        path. step() advances the simulation by one frame,
+        get_lattice() returns the current lattice, and only
+        every every-th frame is rendered and written.
+    """
+    table = ColourTable(colours)
+    writer = FrameWriter(path, fps=fps)
+    try:
+        writer.write(table.rgb(get_lattice(), scale))
+        for frame in range(1, frames + 1):
+            step()
+            if frame % every == 0:
+                writer.write(table.rgb(get_lattice(), scale))
+    finally:
+        writer.close()
+    return writer.count
@@ -0,0 +1,153 @@
+import json
+import os
+import numpy as np
+from instrument import INSTRUMENT
+
+
+def to_json(value):
+    """
+        JSON encoder fallback for NumPy scalars and arrays.
+    """
+    if hasattr(value, "tolist"):
+        return value.tolist()
+    raise TypeError("Cannot store " + repr(value) + " as an attribute.")
+
+
+class ResultStore(object):
+    def __init__(self, path, attrs=None, mode="a"):
+        """
+            Binary result store for sweep outputs, a directory
+            of .npy files plus the run parameters as JSON
+            attributes.
+
+            Attributes:
+            path = path (str), directory of the store.
+            attrs = attrs (dict), parameters recorded with the
+                    results, merged into any already stored.
+            mode = mode (str), "w" starts an empty store, "a"
+                   reopens existing arrays for writing and "r"
+                   is read only.
+        """
+        self.path = path
+        self.mode = mode
+        self.arrays = {}
+        self.attrs = {}
+        if mode == "w" and os.path.isdir(path):
+            for name in os.listdir(path):
+                self.remove(os.path.join(path, name))
+        if mode != "r":
+            os.makedirs(path, exist_ok=True)
+        attrs_path = os.path.join(path, "attrs.json")
+        if os.path.exists(attrs_path):
+            with open(attrs_path, "r") as f:
+                self.attrs = json.load(f)
+        if attrs:
+            self.set_attrs(**attrs)
+
+    def remove(self, path):
+        """
+            Removes a stored file or series directory.
+        """
+        if os.path.isdir(path):
+            for name in os.listdir(path):
+                os.remove(os.path.join(path, name))
+            os.rmdir(path)
+        else:
+            os.remove(path)
+
+    def set_attrs(self, **attrs):
+        """
+            Records parameters of the run as attributes.
+        """
+        self.attrs.update(json.loads(json.dumps(attrs, default=to_json)))
+        tmp = os.path.join(self.path, "attrs.json.tmp")
+        with open(tmp, "w") as f:
+            json.dump(self.attrs, f, indent=1)
+        os.replace(tmp, os.path.join(self.path, "attrs.json"))
+
+    def array_path(self, name):
+        """
+            File of a fixed shape array.
+        """
+        return os.path.join(self.path, name + ".npy")
+
+    def create(self, name, shape, dtype=float, fill=np.nan):
+        """
+            Memory mapped array of the given shape, filled with
+            fill when new (unless fill is None). In append mode
+            an existing array of the same shape is reopened so
+            results survive.
+        """
+        path = self.array_path(name)
+        if self.mode == "a" and os.path.exists(path):
+            array = np.lib.format.open_memmap(path, mode="r+")
+            if array.shape != tuple(shape):
+                raise ValueError("Stored array " + name + " has shape " +
+                                 str(array.shape) + ", not " + str(tuple(shape)))
+        else:
+            array = np.lib.format.open_memmap(path, mode="w+", dtype=dtype,
+                                              shape=tuple(shape))
+            if fill is not None:
+                array[...] = fill
+        self.arrays[name] = array
+        return array
+
+    def save(self, name, values):
+        """
+            Stores a whole array at once, replacing any
+            stored array of that name.
+        """
+        tmp = os.path.join(self.path, name + ".tmp.npy")
+        with INSTRUMENT.timer("io"):
+            np.save(tmp, np.asarray(values))
+            os.replace(tmp, self.array_path(name))
+
+    def write(self, name, index, value):
+        """
+            Writes one grid point (or row) of an array created
+            with create and flushes it to disk.
+        """
+        array = self.arrays[name]
+        array[index] = value
+        with INSTRUMENT.timer("io"):
+            array.flush()
+
+    def append(self, name, rows, start=None):
+        """
+            Appends rows to a series stored as chunk files
+            named by their first row, so long series never
+            need rewriting. Given start, the rows go at that
+            row and any chunks from start on are dropped, so a
+            resumed run can rewrite the rows it repeats.
+        """
+        directory = os.path.join(self.path, name)
+        os.makedirs(directory, exist_ok=True)
+        if start is None:
+            start = sum(chunk.shape[0] for chunk in self.iter_chunks(name))
+        for chunk in os.listdir(directory):
+            if chunk != "tmp.npy" and int(chunk[:-4]) >= start:
+                os.remove(os.path.join(directory, chunk))
+        tmp = os.path.join(directory, "tmp.npy")
+        with INSTRUMENT.timer("io"):
+            np.save(tmp, np.asarray(rows))
+            os.replace(tmp, os.path.join(directory, "%012d.npy" % start))
+
+    def read(self, name):
+        """
+            Lazily memory mapped read of a fixed shape array.
+            A series is never joined in memory, its chunks are
+            returned in order as by iter_chunks.
+        """
+        if os.path.isdir(os.path.join(self.path, name)):
+            return self.iter_chunks(name)
+        return np.load(self.array_path(name), mmap_mode="r")
+
+    def iter_chunks(self, name):
+        """
+            Memory mapped chunks of a series in order, without
+            loading the whole series.
+        """
+        directory = os.path.join(self.path, name)
+        for chunk in sorted(os.listdir(directory)):
+            if chunk != "tmp.npy":
+                yield np.load(os.path.join(directory, chunk), mmap_mode="r")
@@ -0,0 +1,277 @@
+from SIRS_sweeps import heatmap_point, immunity_point, variance_point
+from GOL_ensemble import ensemble_task
+from result_store import ResultStore
+from work_queue import WorkQueue, work
+import multiprocessing as mp
+import numpy as np
+import argparse
+import os
+
+# Repeats of every immune fraction, as in SIRS_plotter.
+IMMUNITY_REPEATS = 5
+# Sweeps per point of the variance cut, as in SIRS_plotter.
+CUT_SWEEPS = 10000
+# Sweep cap of GOL replicas, as in GOL_plotter.
+GOL_MAX_SWEEPS = 4000
+# Function running each kind of task.
+TASK_FUNCTIONS = {"heatmap": heatmap_point, "immunity": immunity_point,
+                  "cut": variance_point, "gol": ensemble_task}
+
+
+def run_task(task, seed):
+    """
+        Runs one queued task with the function of its kind,
+        JSON having turned the lattice size into a list.
+    """
+    task = dict(task, size=tuple(task["size"]))
+    return TASK_FUNCTIONS[task["kind"]](task, seed)
+
+
+def read_sirs_parameters(path):
+    """
+        Sweep specification of a SIRS_plotter parameter file.
+    """
+    with open(path, "r") as input_file:
+        items = input_file.readline().split(", ")
+    return {"model": "sirs", "size": (int(items[0]), int(items[0])),
+            "desired_plot": str(items[1]), "ini": str(items[2]),
+            "p2": float(items[3]), "p_step": float(items[4]),
+            "eqm_sweeps": None if items[5].strip() == "auto" else int(items[5]),
+            "sweeps": int(items[6]),
+            "scheme": items[7].strip() if len(items) > 7 else "sequential"}
+
+
+def read_gol_parameters(path):
+    """
+        Sweep specification of a GOL_plotter parameter file.
+    """
+    with open(path, "r") as input_file:
+        items = input_file.readline().split(", ")
+    return {"model": "gol", "simulations": int(items[0]), "ini": str(items[1]),
+            "size": (int(items[2]), int(items[2]))}
+
+
+def probabilities(spec):
+    """
+        p1 (and p3) values of the heatmap grid.
+    """
+    return np.arange(0.0, 1.0 + spec["p_step"], spec["p_step"])
+
+
+def cut_probabilities():
+    return np.arange(0.2, 0.51, 0.01)
+
+
+def immune_fractions():
+    return np.arange(0.0, 0.525, 0.025)
+
+
+def expand(spec):
+    """
+        Tasks of a sweep specification: one per (p1, p3)
+        point of a heatmap, per p1 of the variance cut, per
+        (repeat, fraction) of the immunity plot, or per batch
+        of random GOL replicas.
+    """
+    tasks = []
+    if spec["model"] == "gol":
+        if spec["ini"] != "random":
+            raise ValueError("Only random GOL starts are an ensemble to queue.")
+        for start in range(0, spec["simulations"], spec["batch"]):
+            tasks.append({"kind": "gol", "size": spec["size"], "max_sweeps": GOL_MAX_SWEEPS,
+                          "replicas": min(spec["batch"], spec["simulations"] - start),
+                          "index": [start]})
+        return tasks
+    # The checkerboard cut still differs from random sequential, as in SIRS_plotter.
+    if spec["scheme"] == "checkerboard":
+        raise ValueError("The checkerboard scheme is not validated for measurements.")
+    point = {"size": spec["size"], "ini": spec["ini"], "p2": spec["p2"],
+             "eqm_sweeps": spec["eqm_sweeps"], "sweeps": spec["sweeps"],
+             "scheme": spec["scheme"], "mean_error": spec.get("mean_error"),
+             "var_error": spec.get("var_error")}
+    if spec["desired_plot"] == "heatmap":
+        p1s = probabilities(spec)
+        for i in range(p1s.size):
+            for j in range(p1s.size):
+                tasks.append(dict(point, kind="heatmap", p1=float(p1s[i]),
+                                  p3=float(p1s[j]), index=[i, j]))
+    elif spec["desired_plot"] == "variance_plot":
+        p1s = cut_probabilities()
+        for i in range(p1s.size):
+            tasks.append(dict(point, kind="cut", p1=float(p1s[i]), p3=0.5,
+                              sweeps=CUT_SWEEPS, index=[i]))
+    elif spec["desired_plot"] == "immunity":
+        im_fracs = immune_fractions()
+        for k in range(IMMUNITY_REPEATS):
+            for f in range(im_fracs.size):
+                tasks.append(dict(point, kind="immunity", p1=0.5, p3=0.5,
+                                  frac=float(im_fracs[f]), sweeps=spec["sweeps"] * 10,
+                                  index=[k, f]))
+    else:
+        raise ValueError("Unknown plot " + spec["desired_plot"] + ".")
+    return tasks
+
+
+def collect(queue, plot=False):
+    """
+        Merges the finished tasks of a queue into the result
+        store of the matching plotter, optionally plotting
+        them. Points that are not finished are left as NaN.
+    """
+    spec = queue.get_meta("spec")
+    finished = queue.results()
+    if spec["model"] == "gol":
+        results = ResultStore("gol_eqm_hist", attrs=spec, mode="w")
+        results.set_attrs(max_sweeps=GOL_MAX_SWEEPS)
+        replica_times = results.create("replica_times", (spec["simulations"],),
+                                       dtype=np.int64, fill=-1)
+        for number, task, times in finished:
+            for r, time in enumerate(times):
+                if time is not None:
+                    replica_times[task["index"][0] + r] = time
+        replica_times.flush()
+        eqm_times = replica_times[replica_times >= 0]
+        results.save("eqm_times", eqm_times)
+        if plot:
+            import GOL_plots
+            GOL_plots.plot_hist(eqm_times, np.arange(0, 3000, 100))
+    elif spec["desired_plot"] == "heatmap":
+        p1s = probabilities(spec)
+        # Rows are p3, columns are p1.
+        phase = np.full((p1s.size, p1s.size), np.nan)
+        variance = np.full((p1s.size, p1s.size), np.nan)
+        for number, task, (psi, var) in finished:
+            i, j = task["index"]
+            phase[j, i] = psi
+            variance[j, i] = var
+        results = ResultStore("phase_data", attrs=spec, mode="w")
+        results.save("p1", p1s)
+        results.save("p3", p1s)
+        results.save("phase", phase)
+        results.save("variance", variance)
+        if plot:
+            import SIRS_plots
+            SIRS_plots.plot_phase_diagram(phase, spec["p_step"])
+            SIRS_plots.plot_variance_contour(variance, spec["p_step"])
+    elif spec["desired_plot"] == "variance_plot":
+        p1s = cut_probabilities()
+        cut = np.full((p1s.size, 2), np.nan)
+        for number, task, values in finished:
+            cut[task["index"][0]] = values
+        results = ResultStore("var_cut", attrs=spec, mode="w")
+        results.set_attrs(p3=0.5, total_sweeps=CUT_SWEEPS)
+        results.save("p1", p1s)
+        results.save("variance", cut[:, 0])
+        results.save("error", cut[:, 1])
+        if plot:
+            import SIRS_plots
+            SIRS_plots.plot_figure(p1s, cut[:, 0], cut[:, 1])
+    elif spec["desired_plot"] == "immunity":
+        im_fracs = immune_fractions()
+        runs = np.full((IMMUNITY_REPEATS, im_fracs.size), np.nan)
+        for number, task, psi in finished:
+            k, f = task["index"]
+            runs[k, f] = psi
+        infected_fracs = np.nanmean(runs, axis=0)
+        im_errors = np.nanstd(runs, axis=0) / \
+            np.sqrt(np.sum(~np.isnan(runs), axis=0))
+        results = ResultStore("immunity", attrs=spec, mode="w")
+        results.set_attrs(p1=0.5, p3=0.5, repeats=IMMUNITY_REPEATS)
+        results.save("immune_fraction", im_fracs)
+        results.save("infected_runs", runs)
+        results.save("infected_fraction", infected_fracs)
+        results.save("error", im_errors)
+        if plot:
+            import SIRS_plots
+            SIRS_plots.plot_immunity(im_fracs, infected_fracs, im_errors)
+    return len(finished)
+
+
+def worker_main(path, lease, max_attempts, poll):
+    """
+        Entry point of a worker process.
+    """
+    done = work(path, run_task, lease=lease, max_attempts=max_attempts, poll=poll)
+    print("Worker " + str(os.getpid()) + " finished " + str(done) + " tasks.")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Spread a SIRS or GOL sweep over any number of workers "
+                    "through a SQLite work queue.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    submit = commands.add_parser("submit", help="expand a parameter file into tasks")
+    submit.add_argument("queue", help="SQLite file of the queue")
+    submit.add_argument("parameters", help="SIRS_plotter or GOL_plotter parameters file")
+    submit.add_argument("--gol", action="store_true",
+                        help="the parameters are a GOL_plotter file")
+    submit.add_argument("--seed", type=int, default=None,
+                        help="root seed of the per task random streams")
+    submit.add_argument("--batch", type=int, default=100,
+                        help="random GOL lattices stepped together per task")
+    submit.add_argument("--mean-error", type=float, default=0.001)
+    submit.add_argument("--var-error", type=float, default=0.01)
+    worker = commands.add_parser("work", help="run tasks until the queue is drained")
+    worker.add_argument("queue")
+    worker.add_argument("--processes", type=int, default=1,
+                        help="worker processes on this node")
+    worker.add_argument("--lease", type=float, default=600.0,
+                        help="seconds before a silent worker's task is reclaimed")
+    worker.add_argument("--max-attempts", type=int, default=3)
+    worker.add_argument("--poll", type=float, default=10.0,
+                        help="seconds between checks for reclaimable tasks")
+    status = commands.add_parser("status", help="print task counts and failures")
+    status.add_argument("queue")
+    status.add_argument("--retry", action="store_true",
+                        help="give failed tasks another set of attempts")
+    merge = commands.add_parser("collect", help="merge results into a result store")
+    merge.add_argument("queue")
+    merge.add_argument("--plot", action="store_true")
+    args = parser.parse_args()
+
+    if args.command == "work" and args.processes == 1:
+        worker_main(args.queue, args.lease, args.max_attempts, args.poll)
+        return
+    if args.command == "work":
+        # Spawned, forking after Numba starts its threads can deadlock.
+        context = mp.get_context("spawn")
+        processes = [context.Process(target=worker_main,
+                                     args=(args.queue, args.lease, args.max_attempts,
+                                           args.poll))
+                     for p in range(args.processes)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        return
+
+    queue = WorkQueue(args.queue)
+    try:
+        if args.command == "submit":
+            if args.gol:
+                spec = read_gol_parameters(args.parameters)
+                spec["batch"] = args.batch
+            else:
+                spec = read_sirs_parameters(args.parameters)
+                if spec["eqm_sweeps"] is None:
+                    spec.update(mean_error=args.mean_error, var_error=args.var_error)
+            spec["seed"] = args.seed
+            tasks = expand(spec)
+            queue.submit(tasks, seed=args.seed)
+            queue.set_meta(spec=spec)
+            print(str(len(tasks)) + " tasks queued in " + args.queue)
+        elif args.command == "status":
+            if args.retry:
+                queue.reset_failed()
+            print(queue.counts())
+            for number, error in queue.failures():
+                print("Task " + str(number) + " failed:\n" + error)
+        elif args.command == "collect":
+            n = collect(queue, args.plot)
+            print(str(n) + " of " + str(sum(queue.counts().values())) + " tasks merged.")
+    finally:
+        queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from instrument import INSTRUMENT, instrumented_call
+
+
+def run_tasks(func, tasks, workers=None, seed=None, skip=()):
+    """
+        Runs func(task, seed) for every task on a process
+        pool and yields (index, result) pairs in the order
+        the tasks finish.
+
+        Each task gets its own independent random stream
+        spawned from one SeedSequence, task i always gets
+        stream i, so results do not depend on scheduling.
+        workers = 1 runs the tasks serially in this process.
+        Indices in skip are not run but keep their streams.
+        While INSTRUMENT is on, every task is recorded as a
+        grid point, keyed by its "index" entry if it has one.
+    """
+    seeds = np.random.SeedSequence(seed).spawn(len(tasks))
+    skip = set(skip)
+    todo = [i for i in range(len(tasks)) if i not in skip]
+    keys = [[int(k) for k in np.atleast_1d(task.get("index", i))]
+            if isinstance(task, dict) else [i] for i, task in enumerate(tasks)]
+    if workers == 1:
+        for i in todo:
+            with INSTRUMENT.point(keys[i]):
+                result = func(tasks[i], seeds[i])
+            yield i, result
+        return
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for i in todo:
+            if INSTRUMENT.enabled:
+                future = pool.submit(instrumented_call, func, tasks[i], seeds[i],
+                                     keys[i], INSTRUMENT.profile_dir)
+            else:
+                future = pool.submit(func, tasks[i], seeds[i])
+            futures[future] = i
+        for future in as_completed(futures):
+            result = future.result()
+            if INSTRUMENT.enabled:
+                result, point = result
+                INSTRUMENT.merge(point)
+                INSTRUMENT.points.append(point)
+            yield futures[future], result
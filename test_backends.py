@@ -0,0 +1,9 @@
+import backends
+
+
+def test_check_equivalence():
+    """
+        Every installed GOL and SIRS backend gives the
+        lattices of the python reference.
+    """
+    backends.check_equivalence()
@@ -0,0 +1,130 @@
+import numpy as np
+
+# Row and column offsets of each neighbourhood. Hexagonal
+# lattices are stored as offset rows, odd rows shifted half a
+# site east, so their diagonal neighbours depend on the row.
+OFFSETS = {"von_neumann": ((-1, 0), (0, 1), (1, 0), (0, -1)),
+           "moore": ((-1, -1), (-1, 0), (-1, 1), (0, 1),
+                     (1, 1), (1, 0), (1, -1), (0, -1)),
+           "hexagonal": (((-1, -1), (-1, 0), (0, 1), (1, 0), (1, -1), (0, -1)),
+                         ((-1, 0), (-1, 1), (0, 1), (1, 1), (1, 0), (0, -1)))}
+BOUNDARIES = ("periodic", "open")
+
+# Tables already built, (shape, neighbourhood, boundary) -> Topology.
+TABLES = {}
+
+
+class Topology(object):
+    def __init__(self, shape, neighbourhood, boundary="periodic"):
+        """
+            Neighbour table of a rectangular lattice, built
+            once so kernels look neighbours up instead of
+            wrapping indices. Use get_topology to share tables.
+
+            Attributes:
+            shape = shape (tuple), rows and columns.
+            neighbourhood = neighbourhood (str), "von_neumann"
+                            (4), "moore" (8) or "hexagonal" (6).
+            boundary = boundary (str), "periodic" or "open".
+            neighbours = (N, k) int32 flat indices of the
+                         neighbours of every flat site. Sites
+                         missing past an open edge are the site
+                         itself, which no update rule reads as
+                         a neighbour (SIRS sites only look for
+                         infected neighbours while susceptible,
+                         GOL counts subtract missing * state).
+            missing = (N,) int8 number of self entries per site.
+        """
+        if neighbourhood not in OFFSETS:
+            raise ValueError("Unknown neighbourhood: " + str(neighbourhood))
+        if boundary not in BOUNDARIES:
+            raise ValueError("Unknown boundary: " + str(boundary))
+        if neighbourhood == "hexagonal" and boundary == "periodic" and shape[0] % 2:
+            raise ValueError("Periodic hexagonal lattices need an even number of rows.")
+        self.shape = tuple(int(n) for n in shape)
+        self.neighbourhood = neighbourhood
+        self.boundary = boundary
+        self.neighbours, self.missing = self.build()
+
+    @property
+    def size(self):
+        return self.shape[0] * self.shape[1]
+
+    @property
+    def degree(self):
+        """
+            Number of neighbours of a site away from any edge.
+        """
+        return self.neighbours.shape[1]
+
+    def build(self):
+        """
+            Computes the neighbour table and missing counts one
+            neighbour column at a time in int32, the only place
+            indices are wrapped. Peak memory is the table plus
+            a few (height, width) int32 arrays.
+        """
+        height, width = self.shape
+        rows = np.arange(height, dtype=np.int32)[:, None]
+        cols = np.arange(width, dtype=np.int32)[None, :]
+        if self.neighbourhood == "hexagonal":
+            # Offsets of even and odd rows.
+            pairs = list(zip(*OFFSETS["hexagonal"]))
+        else:
+            pairs = [(offset, offset) for offset in OFFSETS[self.neighbourhood]]
+        sites = rows * width + cols
+        table = np.empty((self.size, len(pairs)), dtype=np.int32)
+        missing = np.zeros(self.size, dtype=np.int8)
+        for m, (even, odd) in enumerate(pairs):
+            # (height, 1) offsets, picked by row parity.
+            d_rows = np.where(rows % 2 == 0, even[0], odd[0]).astype(np.int32)
+            d_cols = np.where(rows % 2 == 0, even[1], odd[1]).astype(np.int32)
+            nb_rows = rows + d_rows
+            nb_cols = cols + d_cols
+            if self.boundary == "periodic":
+                column = (nb_rows % height) * width + nb_cols % width
+            else:
+                inside = (nb_rows >= 0) & (nb_rows < height) & \
+                    (nb_cols >= 0) & (nb_cols < width)
+                column = np.where(inside, nb_rows * width + nb_cols, sites)
+            table[:, m] = column.reshape(-1)
+            missing += (column == sites).reshape(-1)
+        return table, missing
+
+    def is_bipartite(self):
+        """
+            Checks if a checkerboard colouring has no two
+            neighbours of the same colour.
+        """
+        return is_bipartite(self.shape, self.neighbourhood, self.boundary)
+
+
+def get_topology(shape, neighbourhood, boundary="periodic"):
+    """
+        Shared Topology of a lattice, built on first use.
+    """
+    key = (tuple(int(n) for n in shape), neighbourhood, boundary)
+    if key not in TABLES:
+        TABLES[key] = Topology(*key)
+    return TABLES[key]
+
+
+def is_bipartite(shape, neighbourhood, boundary="periodic"):
+    """
+        Checks if a checkerboard colouring of a lattice has
+        no two neighbours of the same colour.
+    """
+    if neighbourhood != "von_neumann":
+        return False
+    return boundary == "open" or (shape[0] % 2 == 0 and shape[1] % 2 == 0)
+
+
+def neighbour_table(shape, neighbourhood, boundary="periodic"):
+    """
+        Neighbour table the SIRS kernels read, or None for a
+        periodic von Neumann lattice, whose kernels wrap
+        indices instead of keeping 16 bytes per site.
+    """
+    if (neighbourhood, boundary) == ("von_neumann", "periodic"):
+        return None
+    return get_topology(shape, neighbourhood, boundary).neighbours
@@ -0,0 +1,265 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+import numpy as np
+from instrument import INSTRUMENT
+from result_store import to_json
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tasks (
+    number INTEGER PRIMARY KEY,
+    task TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_until REAL,
+    token TEXT,
+    worker TEXT,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+"""
+
+
+class WorkQueue(object):
+    def __init__(self, path, lease=600.0, max_attempts=3):
+        """
+            Queue of sweep tasks in a SQLite file that any
+            number of workers, on any nodes sharing the file,
+            claim tasks from. A claim is a lease: a worker
+            that stops renewing it (crashed, killed, node
+            lost) lets the task be claimed again once it runs
+            out. Failed tasks are retried up to max_attempts
+            times. The file needs a filesystem with working
+            POSIX locks, as SQLite locks it for every claim.
+
+            Attributes:
+            path = path (str), SQLite file of the queue.
+            lease = lease (float), seconds a claim lasts
+                    without being renewed.
+            max_attempts = max_attempts (int), claims of a task
+                           before it is marked failed.
+        """
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # Autocommit, transactions are opened explicitly.
+        self.db = sqlite3.connect(path, timeout=60.0, isolation_level=None)
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def set_meta(self, **values):
+        """
+            Stores JSON values describing the sweep.
+        """
+        self.db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                            [(name, json.dumps(value, default=to_json))
+                             for name, value in values.items()])
+
+    def get_meta(self, name, default=None):
+        row = self.db.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return default
+        return json.loads(row[0])
+
+    def submit(self, tasks, seed=None):
+        """
+            Adds JSON serialisable tasks, numbered in order.
+            Task i runs with stream i spawned from seed, the
+            same stream run_tasks gives it, so a queued sweep
+            gives the same results as a local one.
+        """
+        if self.db.execute("SELECT COUNT(*) FROM tasks").fetchone()[0] > 0:
+            raise ValueError("Queue " + self.path + " already holds tasks.")
+        self.set_meta(entropy=str(np.random.SeedSequence(seed).entropy))
+        self.db.execute("BEGIN IMMEDIATE")
+        self.db.executemany("INSERT INTO tasks (number, task) VALUES (?, ?)",
+                            [(i, json.dumps(task, default=to_json))
+                             for i, task in enumerate(tasks)])
+        self.db.execute("COMMIT")
+
+    def seed(self, number):
+        """
+            Random stream of task number.
+        """
+        return np.random.SeedSequence(int(self.get_meta("entropy")), spawn_key=(number,))
+
+    def claim(self, worker):
+        """
+            Claims a pending task, or one whose lease has run
+            out, returning (number, task, token) or None if
+            none can be claimed now.
+        """
+        now = time.time()
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            # Abandoned tasks out of attempts fail for good.
+            self.db.execute("UPDATE tasks SET status = 'failed', error = 'lease expired' "
+                            "WHERE status = 'running' AND lease_until < ? AND attempts >= ?",
+                            (now, self.max_attempts))
+            row = self.db.execute(
+                "SELECT number, task FROM tasks WHERE status = 'pending' OR "
+                "(status = 'running' AND lease_until < ?) ORDER BY number LIMIT 1",
+                (now,)).fetchone()
+            if row is None:
+                self.db.execute("COMMIT")
+                return None
+            token = uuid.uuid4().hex
+            self.db.execute("UPDATE tasks SET status = 'running', attempts = attempts + 1, "
+                            "lease_until = ?, token = ?, worker = ? WHERE number = ?",
+                            (now + self.lease, token, worker, row[0]))
+            self.db.execute("COMMIT")
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        return row[0], json.loads(row[1]), token
+
+    def renew(self, number, token):
+        """
+            Extends the lease of a claimed task, returning
+            False if the claim has been lost.
+        """
+        cursor = self.db.execute("UPDATE tasks SET lease_until = ? WHERE number = ? AND "
+                                 "token = ? AND status = 'running'",
+                                 (time.time() + self.lease, number, token))
+        return cursor.rowcount == 1
+
+    def complete(self, number, token, result):
+        """
+            Stores the result of a claimed task. Results of
+            claims that were lost are dropped, the task has
+            been handed to another worker.
+        """
+        cursor = self.db.execute("UPDATE tasks SET status = 'done', result = ?, "
+                                 "lease_until = NULL WHERE number = ? AND token = ? AND "
+                                 "status = 'running'",
+                                 (json.dumps(result, default=to_json), number, token))
+        return cursor.rowcount == 1
+
+    def fail(self, number, token, error):
+        """
+            Releases a claimed task that raised, for a retry,
+            or marks it failed once it is out of attempts.
+        """
+        self.db.execute("UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' "
+                        "ELSE 'pending' END, error = ?, lease_until = NULL "
+                        "WHERE number = ? AND token = ? AND status = 'running'",
+                        (self.max_attempts, error, number, token))
+
+    def counts(self):
+        """
+            Number of tasks in each status.
+        """
+        counts = {"pending": 0, "running": 0, "done": 0, "failed": 0}
+        for status, n in self.db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+            counts[status] = n
+        return counts
+
+    def unfinished(self):
+        """
+            Number of tasks still pending or running.
+        """
+        counts = self.counts()
+        return counts["pending"] + counts["running"]
+
+    def results(self):
+        """
+            (number, task, result) of every finished task.
+        """
+        return [(number, json.loads(task), json.loads(result)) for number, task, result in
+                self.db.execute("SELECT number, task, result FROM tasks "
+                                "WHERE status = 'done' ORDER BY number")]
+
+    def failures(self):
+        """
+            (number, error) of every failed task.
+        """
+        return self.db.execute("SELECT number, error FROM tasks WHERE status = 'failed' "
+                               "ORDER BY number").fetchall()
+
+    def reset_failed(self):
+        """
+            Gives failed tasks a fresh set of attempts.
+        """
+        self.db.execute("UPDATE tasks SET status = 'pending', attempts = 0 "
+                        "WHERE status = 'failed'")
+
+
+class Heartbeat(object):
+    def __init__(self, path, number, token, lease):
+        """
+            Thread renewing the lease of a claimed task three
+            times per lease while it runs, on its own
+            connection to the queue.
+
+            Attributes:
+            path = path (str), SQLite file of the queue.
+            number = number (int), claimed task.
+            token = token (str), claim being renewed.
+            lease = lease (float), seconds each renewal lasts.
+        """
+        self.path = path
+        self.number = number
+        self.token = token
+        self.lease = lease
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        queue = WorkQueue(self.path, self.lease)
+        try:
+            while not self.stopped.wait(self.lease / 3):
+                if not queue.renew(self.number, self.token):
+                    break
+        finally:
+            queue.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
+        return False
+
+
+def work(path, func, worker=None, lease=600.0, max_attempts=3, poll=10.0):
+    """
+        Drains the queue at path, running func(task, seed)
+        for every task it claims. Returns the number of
+        tasks it completed once no task is left unfinished;
+        while other workers still hold leases it polls every
+        poll seconds in case one of them runs out.
+    """
+    if worker is None:
+        worker = socket.gethostname() + ":" + str(os.getpid())
+    queue = WorkQueue(path, lease, max_attempts)
+    done = 0
+    try:
+        while True:
+            claim = queue.claim(worker)
+            if claim is None:
+                if queue.unfinished() == 0:
+                    return done
+                time.sleep(poll)
+                continue
+            number, task, token = claim
+            try:
+                with Heartbeat(path, number, token, lease), INSTRUMENT.point([number]):
+                    result = func(task, queue.seed(number))
+            except Exception:
+                queue.fail(number, token, traceback.format_exc())
+                continue
+            if queue.complete(number, token, result):
+                done += 1
+    finally:
+        queue.close()